@@ -19,8 +19,121 @@ SQLALCHEMY_TRACK_MODIFICATIONS = False
 
 # Cohere (for AI feedback on recordings). Set COHERE_API_KEY in .env or environment.
 COHERE_API_KEY = os.getenv("COHERE_API_KEY", "")
+COHERE_MODEL = "command-r-plus-08-2024"
+
+# Feedback requests time out after these many seconds. After
+# FEEDBACK_BREAKER_FAILURES failures in a row Cohere is not called for
+# FEEDBACK_BREAKER_RESET_SECONDS and recordings get the fallback text at once.
+FEEDBACK_CONNECT_TIMEOUT = 5
+FEEDBACK_READ_TIMEOUT = 30
+FEEDBACK_BREAKER_FAILURES = 5
+FEEDBACK_BREAKER_RESET_SECONDS = 60
+
+# Feedback cache: identical readings of the same lesson (ignoring case and
+# punctuation) reuse earlier feedback instead of calling Cohere again.
+FEEDBACK_CACHE_MAX_ENTRIES = 20000
+FEEDBACK_CACHE_TTL_SECONDS = 7 * 24 * 3600  # 7 days
+
+# Feedback requests arriving within FEEDBACK_BATCH_WINDOW_SECONDS of each
+# other are sent to Cohere as one call (at most FEEDBACK_BATCH_MAX
+# transcripts). Set the window to 0 to send every request on its own.
+# Batches form between the local job pool's threads (JOB_QUEUE_WORKERS > 1);
+# with the "worker" backend, or when no other job is running, a request is
+# sent immediately without waiting for the window.
+FEEDBACK_BATCH_WINDOW_SECONDS = 0.5
+FEEDBACK_BATCH_MAX = 8
+
+# Short recordings and clean, complete lesson readings get rule-based
+# feedback computed locally; only the rest is sent to Cohere.
+FEEDBACK_LOCAL_FAST_PATH = True
+
+# Rate limits for outside services, shared by every process on the host
+# (kept in CACHE_DB_PATH). Per provider: `rate` calls per second, `burst`
+# calls allowed at once after a quiet spell, and `max_queue` calls that may
+# wait for a slot before more are shed. `shed` says what happens then:
+#   "defer"    : put the recording back in the queue for RATE_LIMIT_RETRY_SECONDS
+#   "fallback" : finish now (rule-based feedback; for speech, a transcription
+#                error that `flask --app app retranscribe` can fix later)
+# Providers not listed (the local vosk and stub engines) are not limited.
+RATE_LIMITS = {
+    "google": {"rate": 5, "burst": 10, "max_queue": 100, "shed": "defer"},
+    "cohere": {"rate": 20 / 60, "burst": 5, "max_queue": 20, "shed": "fallback"},
+}
+RATE_LIMIT_RETRY_SECONDS = 30
 
 # Application Settings
 UPLOAD_FOLDER = "uploads"
 MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
-ALLOWED_EXTENSIONS = {'wav', 'mp3', 'm4a', 'flac', 'webm'}
+MAX_RECORDING_SECONDS = 10 * 60  # longer recordings are rejected on upload
+# Uploads in a container services/probe.py can't parse are checked with
+# ffprobe, given at most this long.
+PROBE_TIMEOUT_SECONDS = 10
+ALLOWED_EXTENSIONS = {'wav', 'mp3', 'm4a', 'flac', 'webm', 'ogg', 'opus'}
+
+# Ingest: each upload is converted once to 16 kHz mono in a compact codec
+# ("opus" or "flac") and transcription/playback use the converted file.
+# Set KEEP_ORIGINAL_UPLOADS to also keep what the browser sent.
+NORMALIZE_UPLOADS = True
+NORMALIZED_SAMPLE_RATE = 16000
+NORMALIZED_FORMAT = os.getenv("LEXISTREAM_AUDIO_FORMAT", "opus")
+NORMALIZED_OPUS_BITRATE = "24k"
+KEEP_ORIGINAL_UPLOADS = os.getenv("LEXISTREAM_KEEP_ORIGINAL_UPLOADS", "0") == "1"
+
+# Admin user/recording lists: rows per page, and how long the "about N"
+# total for a set of filters is reused before it is counted again.
+ADMIN_PAGE_SIZE = 50
+ADMIN_COUNT_CACHE_SECONDS = 5 * 60
+
+# Progress chart: points sent per request by default, and the most a client
+# may ask for; longer histories are downsampled to that many (LTTB).
+PROGRESS_CHART_POINTS = 120
+PROGRESS_CHART_MAX_POINTS = 1000
+
+# Transcript search (teachers and admins): results per page.
+SEARCH_PAGE_SIZE = 20
+
+# Background processing of recordings (transcription + AI feedback).
+#   "local"  : run jobs on a thread pool inside the web process
+#   "worker" : only queue jobs; run `flask --app app worker` as a separate process
+JOB_QUEUE_BACKEND = os.getenv("LEXISTREAM_JOB_BACKEND", "local")
+JOB_QUEUE_WORKERS = int(os.getenv("LEXISTREAM_JOB_WORKERS", "2"))
+JOB_WORKER_POLL_SECONDS = 2
+
+# Live result page: each server-sent-events response lasts at most
+# EVENTS_STREAM_SECONDS, then the browser reconnects after EVENTS_RECONNECT_MS.
+EVENTS_STREAM_SECONDS = 10
+EVENTS_RECONNECT_MS = 1000
+
+# Transcription: long recordings are split at pauses into segments of at most
+# TRANSCRIBE_MAX_SEGMENT_SECONDS and transcribed TRANSCRIBE_SEGMENT_WORKERS at a time.
+TRANSCRIBE_MAX_SEGMENT_SECONDS = 30
+TRANSCRIBE_MIN_SILENCE_MS = 500
+TRANSCRIBE_SEGMENT_WORKERS = int(os.getenv("LEXISTREAM_TRANSCRIBE_WORKERS", "4"))
+
+# Speech-to-text engine: "google" (Google Web Speech, needs internet),
+# "vosk" (local CPU, needs `pip install vosk` and a model directory) or
+# "stub" (deterministic fake for tests).
+TRANSCRIPTION_ENGINE = os.getenv("LEXISTREAM_TRANSCRIPTION_ENGINE", "google")
+VOSK_MODEL_PATH = os.getenv("LEXISTREAM_VOSK_MODEL", "models/vosk-model-small-en-us-0.15")
+
+# Local SQLite file holding LexiStream's persistent caches.
+CACHE_DB_PATH = os.getenv("LEXISTREAM_CACHE_PATH", os.path.join("instance", "lexistream_cache.sqlite"))
+
+# Transcript cache keyed by a hash of the decoded audio, so re-submitted
+# recordings are not sent to the recognizer again.
+TRANSCRIPT_CACHE_MAX_ENTRIES = 20000
+TRANSCRIPT_CACHE_TTL_SECONDS = 30 * 24 * 3600  # 30 days
+
+# Streaming uploads: the browser sends the recording in chunks while the
+# student is still speaking, and finished stretches of speech (at least
+# STREAM_SEGMENT_SECONDS long) are transcribed straight away.
+STREAM_SEGMENT_SECONDS = 8
+STREAM_QUEUE_WORKERS = int(os.getenv("LEXISTREAM_STREAM_WORKERS", "2"))
+# Streamed uploads never finished (tab closed mid-recording) are deleted once
+# this old; the sweep runs at most every STREAM_SWEEP_INTERVAL_SECONDS.
+STREAM_ABANDONED_SECONDS = MAX_RECORDING_SECONDS + 30 * 60
+STREAM_SWEEP_INTERVAL_SECONDS = 10 * 60
+
+# `flask --app app retranscribe` saves its position here so an interrupted
+# backfill resumes where it stopped.
+RETRANSCRIBE_CHECKPOINT_PATH = os.path.join("instance", "retranscribe_checkpoint.json")
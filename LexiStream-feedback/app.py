@@ -3,13 +3,33 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
-from flask import send_from_directory
+from flask import send_from_directory, Response, stream_with_context
 from datetime import datetime, timedelta
 from functools import wraps
 from sqlalchemy import text, inspect
+from sqlalchemy.exc import IntegrityError
 import os
 import json
+import queue
+import threading
+import time
+import click
 from api_keys.config import *
+from services.jobs import JobQueue
+from services.broadcast import Broadcaster
+from services.audio import (decode_audio, decode_audio_from, detect_speech, pack_speech, completed_speech_spans, pcm_fingerprint,
+                            normalize_for_storage, export_for_storage, STORAGE_FORMATS)
+from services.cache import PersistentCache
+from services.engines import get_engine
+from services.feedback import FeedbackService, NOTED_FEEDBACK, FALLBACK_FEEDBACK
+from services.local_feedback import compute_signals, needs_llm, local_feedback
+from services.alignment import align_to_lesson
+from services.charts import lttb
+from services.pagination import keyset_page
+from services.probe import probe_audio, ffprobe_audio, AudioInfo, ProbeError
+from services.ratelimit import RateLimiter, RateLimited, SHED_DEFER, SHED_FALLBACK
+from services.transcription import transcribe_segments, TranscriptionResult
+from services import metrics, migrations, search
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = SECRET_KEY
@@ -45,18 +65,39 @@ class User(UserMixin, db.Model):
     website = db.Column(db.String(255))
     avatar_url = db.Column(db.String(255))
     role = db.Column(db.String(20), default="user", nullable=False)  # user, teacher, admin
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    # Admin user list: newest first, optionally by role (keyset pagination)
+    __table_args__ = (
+        db.Index("ix_user_created_at_id", "created_at", "id"),
+        db.Index("ix_user_role_created_at_id", "role", "created_at", "id"),
+    )
 
 class Recording(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    lesson_id = db.Column(db.Integer, db.ForeignKey('lesson.id'), nullable=True)  # lesson being read, if any
     filename = db.Column(db.String(255), nullable=False)
+    original_filename = db.Column(db.String(255))  # as uploaded, before 16 kHz normalization
     transcript = db.Column(db.Text)
+    transcript_segments = db.Column(db.Text)  # JSON list of {start, end, text, error, elapsed}
     ai_feedback = db.Column(db.Text)  # OpenAI-generated feedback on what user said
     words_per_minute = db.Column(db.Float)
+    articulation_rate = db.Column(db.Float)  # words per minute of speech, pauses excluded
     duration_seconds = db.Column(db.Float)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    speech_seconds = db.Column(db.Float)  # voiced part of the recording (VAD)
+    reading_accuracy = db.Column(db.Float)  # share of lesson words read correctly
+    reading_wer = db.Column(db.Float)  # word error rate against the lesson
+    status = db.Column(db.String(20), default="done", nullable=False)  # pending, processing, done, failed
+    processing_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     user = db.relationship('User', backref=db.backref('recordings', lazy=True))
+    lesson = db.relationship('Lesson')
+    # Admin recording list: newest first, per user, by WPM range (keyset pagination)
+    __table_args__ = (
+        db.Index("ix_recording_created_at_id", "created_at", "id"),
+        db.Index("ix_recording_user_created_at_id", "user_id", "created_at", "id"),
+        db.Index("ix_recording_words_per_minute", "words_per_minute"),
+    )
 
 class Lesson(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -72,6 +113,7 @@ class Progress(db.Model):
     words_per_minute = db.Column(db.Float, nullable=False)
     date = db.Column(db.DateTime, default=datetime.utcnow)
     user = db.relationship('User', backref=db.backref('progress', lazy=True))
+    __table_args__ = (db.Index("ix_progress_user_id_date", "user_id", "date"),)
 
 class Review(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -81,6 +123,10 @@ class Review(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     recording = db.relationship('Recording', backref=db.backref('reviews', lazy=True))
     reviewer = db.relationship('User', backref=db.backref('reviews_given', lazy=True))
+    __table_args__ = (
+        db.Index("ix_review_recording_id", "recording_id"),
+        db.Index("ix_review_reviewer_id", "reviewer_id"),
+    )
 
 class Vocabulary(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -91,6 +137,7 @@ class Vocabulary(db.Model):
     notes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     user = db.relationship('User', backref=db.backref('vocabulary', lazy=True))
+    __table_args__ = (db.Index("ix_vocabulary_user_id_created_at", "user_id", "created_at"),)
 
 class Goal(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -100,6 +147,25 @@ class Goal(db.Model):
     last_activity_date = db.Column(db.Date)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     user = db.relationship('User', backref=db.backref('goals', lazy=True))
+    __table_args__ = (db.Index("uq_goal_user_id", "user_id", unique=True),)  # one goal per user
+
+class DailyStat(db.Model):
+    """Per-user totals for one (UTC) day, kept up to date as recordings are saved and deleted."""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    seconds = db.Column(db.Float, nullable=False, default=0)
+    recordings = db.Column(db.Integer, nullable=False, default=0)
+    wpm_sum = db.Column(db.Float, nullable=False, default=0)
+    wpm_max = db.Column(db.Float, nullable=False, default=0)
+
+    @property
+    def average_wpm(self):
+        return self.wpm_sum / self.recordings if self.recordings else 0
+
+class SiteCounter(db.Model):
+    """Running row counts for the admin and teacher dashboards, changed along with the rows they count."""
+    name = db.Column(db.String(60), primary_key=True)  # users, recordings, lessons, reviews, reviews_by:<user id>
+    value = db.Column(db.Integer, nullable=False, default=0)
 
 @login_manager.user_loader
 def load_user(user_id):
@@ -108,46 +174,97 @@ def load_user(user_id):
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-# Speech-to-Text using Google API (simplified for free tier)
+# Speech-to-Text (engine selected by TRANSCRIPTION_ENGINE in api_keys/config.py)
+def get_transcription_engine():
+    """This process's configured speech-to-text engine (created once, then reused)."""
+    options = {"vosk": {"model_path": VOSK_MODEL_PATH}}.get(TRANSCRIPTION_ENGINE, {})
+    return get_engine(TRANSCRIPTION_ENGINE, **options)
+
+# One token bucket per outside provider, shared by all processes (see RATE_LIMITS)
+rate_limiters = {
+    provider: RateLimiter(CACHE_DB_PATH, provider, **options)
+    for provider, options in RATE_LIMITS.items()
+}
+
+transcript_cache = PersistentCache(
+    CACHE_DB_PATH, "transcripts",
+    max_entries=TRANSCRIPT_CACHE_MAX_ENTRIES,
+    ttl_seconds=TRANSCRIPT_CACHE_TTL_SECONDS,
+)
+
+def load_audio_for_engine(file_path, engine, start_ms=0):
+    """
+    Decode straight to in-memory PCM (no temporary WAV on disk) at the engine's rate.
+
+    With `start_ms` only the audio from there on is decoded (and returned).
+    """
+    # Normalized uploads hold 16 kHz speech, but Opus always decodes to 48 kHz;
+    # resample so the recognizer isn't sent three times the samples it needs.
+    sample_rate = engine.sample_rate or (NORMALIZED_SAMPLE_RATE if NORMALIZE_UPLOADS else None)
+    if start_ms:
+        return decode_audio_from(file_path, start_ms, sample_rate or NORMALIZED_SAMPLE_RATE)
+    audio = decode_audio(file_path)
+    if sample_rate and audio.frame_rate != sample_rate:
+        audio = audio.set_frame_rate(sample_rate)
+    return audio
+
+def transcribe_audio_detailed(file_path, committed_segments=None, bounded=True):
+    """
+    Decode, trim silence, split at pauses and transcribe segments in parallel.
+
+    Returns a TranscriptionResult whose `speech_ms` is the voiced part of the
+    recording. `committed_segments` are segment dicts already transcribed
+    while a streamed upload was still in progress; only the audio after the
+    last one is sent to the recognizer.
+
+    Raises RateLimited if the speech provider's wait queue is full; with
+    `bounded=False` it waits for a slot however long the queue is.
+    """
+    engine = get_transcription_engine()
+    audio = load_audio_for_engine(file_path, engine)
+
+    # Voice-activity detection: only speech is sent to the recognizer, and
+    # its length is what articulation rate is measured against.
+    speech = detect_speech(audio, min_silence_ms=TRANSCRIBE_MIN_SILENCE_MS)
+    speech_ms = sum(end - start for start, end in speech)
+
+    # Same audio + same engine = same transcript, whatever container it came in.
+    cache_key = f"{engine.name}:{pcm_fingerprint(audio)}"
+    cached = transcript_cache.get(cache_key)
+    if cached is not None:
+        return TranscriptionResult.from_dicts(cached, cached=True, speech_ms=speech_ms)
+
+    committed = TranscriptionResult.from_dicts(committed_segments or [])
+    offset_ms = committed.segments[-1].end_ms if committed.segments else 0
+    remaining = [(max(start, offset_ms), end) for start, end in speech if end > offset_ms]
+    spans = [
+        (max(start, offset_ms), end)
+        for start, end in pack_speech(remaining, len(audio),
+                                      max_segment_ms=TRANSCRIBE_MAX_SEGMENT_SECONDS * 1000)
+    ]
+    metrics.incr("audio.ms.silence_trimmed",
+                 (len(audio) - offset_ms) - sum(end - start for start, end in spans))
+    limiter = rate_limiters.get(engine.name)
+    if limiter is not None and spans:
+        limiter.acquire(len(spans), bounded=bounded)
+    remainder = transcribe_segments(audio, spans, engine.transcribe,
+                                    max_workers=TRANSCRIBE_SEGMENT_WORKERS)
+    result = TranscriptionResult.from_dicts(
+        committed.segments_as_dicts() + remainder.segments_as_dicts(),
+        speech_ms=speech_ms,
+    )
+    # Don't cache partial results; a failed segment may succeed on retry.
+    if result.text and result.complete:
+        transcript_cache.set(cache_key, result.segments_as_dicts())
+    return result
+
 def transcribe_audio(file_path):
-    """Transcribe audio file using Google Speech API"""
+    """Transcribe audio file using the configured speech-to-text engine"""
     try:
-        import speech_recognition as sr
-        from pydub import AudioSegment
-        import os
-        import tempfile
-        
-        # Convert audio to WAV if needed
-        audio = AudioSegment.from_file(file_path)
-        
-        # Export to WAV format for speech recognition
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as tmp_file:
-            audio.export(tmp_file.name, format="wav")
-            temp_wav_path = tmp_file.name
-        
-        try:
-            r = sr.Recognizer()
-            with sr.AudioFile(temp_wav_path) as source:
-                # Adjust for ambient noise
-                audio_data = r.record(source)
-            
-            # Using Google Web Speech API (free, no key needed)
-            try:
-                transcript = r.recognize_google(audio_data)
-                os.unlink(temp_wav_path)  # Clean up temp file
-                return transcript, None
-            except sr.UnknownValueError:
-                os.unlink(temp_wav_path)
-                return None, "Could not understand audio. Please speak more clearly."
-            except sr.RequestError as e:
-                os.unlink(temp_wav_path)
-                return None, f"Error with speech recognition service: {e}"
-        except Exception as e:
-            if os.path.exists(temp_wav_path):
-                os.unlink(temp_wav_path)
-            return None, f"Error processing audio: {str(e)}"
+        result = transcribe_audio_detailed(file_path)
+        return result.text or None, result.error
     except Exception as e:
-        return None, f"Error: {str(e)}"
+        return None, f"Error processing audio: {str(e)}"
 
 def calculate_wpm(transcript, duration_seconds):
     """Calculate words per minute"""
@@ -157,135 +274,511 @@ def calculate_wpm(transcript, duration_seconds):
     wpm = (word_count / duration_seconds) * 60
     return round(wpm, 2)
 
-import cohere
-
-client = cohere.ClientV2(api_key=COHERE_API_KEY)
+def score_recording_reading(recording):
+    """Set reading accuracy/WER from aligning the transcript with the lesson (if any)."""
+    if recording.lesson and recording.transcript:
+        score = align_to_lesson(recording.transcript, recording.lesson.content)
+        recording.reading_accuracy = round(score.accuracy, 4)
+        recording.reading_wer = round(score.wer, 4)
+    else:
+        recording.reading_accuracy = None
+        recording.reading_wer = None
+
+def calculate_articulation_rate(transcript, speech_seconds):
+    """Words per minute of actual speech, so pauses and silence don't count against the student"""
+    if not speech_seconds:
+        return None
+    return calculate_wpm(transcript, speech_seconds)
+
+feedback_cache = PersistentCache(
+    CACHE_DB_PATH,
+    "feedback",
+    max_entries=FEEDBACK_CACHE_MAX_ENTRIES,
+    ttl_seconds=FEEDBACK_CACHE_TTL_SECONDS,
+)
+
+def feedback_batch_peers():
+    """How many other recordings could join a feedback batch right now."""
+    if JOB_QUEUE_BACKEND != "local":
+        return 0  # the worker process handles one recording at a time
+    # Jobs waiting for a free thread can't reach the feedback step meanwhile.
+    return max(0, min(job_queue.depth(), job_queue.max_workers) - 1)
+
+feedback_service = FeedbackService(
+    COHERE_API_KEY,
+    model=COHERE_MODEL,
+    connect_timeout=FEEDBACK_CONNECT_TIMEOUT,
+    read_timeout=FEEDBACK_READ_TIMEOUT,
+    failure_threshold=FEEDBACK_BREAKER_FAILURES,
+    reset_seconds=FEEDBACK_BREAKER_RESET_SECONDS,
+    cache=feedback_cache,
+    batch_window_seconds=FEEDBACK_BATCH_WINDOW_SECONDS,
+    max_batch=FEEDBACK_BATCH_MAX,
+    batch_peers=feedback_batch_peers,
+    limiter=rate_limiters.get("cohere"),
+)
+
+def get_ai_feedback(transcript: str, lesson_id=None) -> str:
+    """Coaching feedback from Cohere, or a friendly fallback if it can't be reached."""
+    return feedback_service.feedback(transcript, lesson_id=lesson_id)
+
+def generate_feedback(transcript, duration_seconds, speech_seconds=None,
+                      lesson_id=None, lesson_text=None, on_delta=None):
+    """
+    Feedback for a transcript: local rules when they are enough, Cohere otherwise.
+
+    With `on_delta` the text is also handed over piece by piece as it is
+    produced (for the live result page). If Cohere's rate limit sheds the
+    request, the local rules answer instead, or RateLimited is raised when
+    its shed setting is "defer". The local rules also stand in whenever the
+    service could only give its placeholder text (no API key, breaker open,
+    failed call).
+    """
+    signals = compute_signals(transcript, duration_seconds, speech_seconds, lesson_text)
+    if FEEDBACK_LOCAL_FAST_PATH and not needs_llm(signals):
+        metrics.incr("feedback.local")
+    else:
+        metrics.incr("feedback.llm")
+        try:
+            if on_delta:
+                text = feedback_service.feedback_stream(transcript, on_delta, lesson_id=lesson_id)
+            else:
+                text = get_ai_feedback(transcript, lesson_id=lesson_id)
+            if text not in (NOTED_FEEDBACK, FALLBACK_FEEDBACK):
+                return text
+            metrics.incr("feedback.placeholder_to_local")
+        except RateLimited as e:
+            if e.shed != SHED_FALLBACK:
+                raise
+            metrics.incr("feedback.shed_to_local")
+    text = local_feedback(signals)
+    if on_delta:
+        on_delta(text)
+    return text
+
+# Background processing of saved recordings
+job_queue = JobQueue(max_workers=JOB_QUEUE_WORKERS)
+
+# Live updates for open result pages, keyed by recording id
+recording_events = Broadcaster()
+
+def claim_recording(recording_id):
+    """
+    Atomically move a recording from 'pending' to 'processing'.
 
-def get_ai_feedback(transcript: str) -> str:
-    if not transcript or not transcript.strip():
-        return "Your recording is noted! Try to maintain clarity and consistent pace."
+    Returns True if this caller won the claim. Both the local thread pool and
+    the separate worker process go through here, so a recording is never
+    processed twice.
+    """
+    claimed = Recording.query.filter_by(id=recording_id, status="pending")\
+        .update({"status": "processing"}, synchronize_session=False)
+    db.session.commit()
+    return claimed == 1
 
-    if not COHERE_API_KEY:
-        return "Your recording is noted! Try to maintain clarity and consistent pace."
+def normalize_recording(recording):
+    """
+    Convert a recording's upload to compact 16 kHz mono storage, once.
 
+    `recording.filename` is switched to the converted file, which is what
+    transcription and playback use from then on; the upload's own name is
+    kept in `original_filename` (the file itself only with
+    KEEP_ORIGINAL_UPLOADS). If conversion fails the original is used as-is.
+    Returns the path to transcribe.
+    """
+    folder = os.path.join(app.config['UPLOAD_FOLDER'], 'recordings')
+    source = os.path.join(folder, recording.filename)
+    if not NORMALIZE_UPLOADS or recording.original_filename:
+        return source
+
+    extension, _ = STORAGE_FORMATS[NORMALIZED_FORMAT]
+    base, _ = os.path.splitext(recording.filename)
+    filename = f"{base}_{NORMALIZED_SAMPLE_RATE // 1000}k.{extension}"
     try:
-        import cohere
-        client = cohere.ClientV2(api_key=COHERE_API_KEY)
+        audio = normalize_for_storage(decode_audio(source), NORMALIZED_SAMPLE_RATE)
+        stats = {}
+        export_for_storage(audio, os.path.join(folder, filename), NORMALIZED_FORMAT,
+                           bitrate=NORMALIZED_OPUS_BITRATE, stats=stats)
+    except Exception as e:
+        print("Audio normalization failed, keeping the original upload:", e)
+        return source
 
-        transcript_for_ai = (
-            "This is a language learning exercise. "
-            "The user read the following transcript aloud (some words may be repeated intentionally for practice):\n\n"
-            f"{transcript}"
-        )
+    metrics.incr("audio.bytes.saved", max(0, os.path.getsize(source) - stats["stored"]))
+    recording.original_filename = recording.filename
+    recording.filename = filename
+    db.session.commit()
+    if not KEEP_ORIGINAL_UPLOADS:
+        os.remove(source)
+    return os.path.join(folder, filename)
 
-        response = client.chat(
-            model="command-r-plus-08-2024",
-            messages=[
-                {
-                    "role": "system",
-                    "content": (
-                        "You are a friendly language coach. ALWAYS provide feedback, "
-                        "even if the transcript is short, repeated, or unclear. "
-                        "Give 2-3 short, constructive sentences focusing on clarity, pace, "
-                        "pronunciation, and effort."
-                    )
-                },
-                {"role": "user", "content": transcript_for_ai}
-            ],
-            max_tokens=200
-        )
+def defer_recording(recording, retry_after):
+    """
+    Put a recording back to 'pending' because an outside service is saturated.
+
+    The local pool picks it up again after RATE_LIMIT_RETRY_SECONDS (or the
+    limiter's own estimate, if longer). Returns that delay.
+    """
+    delay = max(RATE_LIMIT_RETRY_SECONDS, retry_after)
+    recording.status = "pending"
+    db.session.commit()
+    metrics.incr("jobs.deferred")
+    if JOB_QUEUE_BACKEND == "local":
+        timer = threading.Timer(delay, enqueue_recording, (recording.id,))
+        timer.daemon = True
+        timer.start()
+    return delay
+
+def process_recording(recording_id):
+    """
+    Transcribe a saved recording, record progress and attach AI feedback.
 
-        msg = getattr(response, "message", None)
-        if msg:
-            content = getattr(msg, "content", None)
-            if isinstance(content, list):
-                texts = [p.text for p in content if getattr(p, "text", None)]
-                ai_feedback = " ".join(texts).strip() if texts else None
-            elif hasattr(content, "text"):
-                ai_feedback = content.text.strip()
+    Returns the retry delay when the recording was deferred by a rate limit.
+    """
+    with app.app_context():
+        if not claim_recording(recording_id):
+            return
+        recording = db.session.get(Recording, recording_id)
+        try:
+            filepath = normalize_recording(recording)
+
+            transcript = None
+            try:
+                committed = json.loads(recording.transcript_segments or "[]")
+                result = transcribe_audio_detailed(filepath, committed_segments=committed)
+                transcript = result.text or None
+                recording.transcript_segments = json.dumps(result.segments_as_dicts())
+                recording.speech_seconds = result.speech_ms / 1000 if result.speech_ms is not None else None
+                if result.error:
+                    recording.processing_error = f'Transcription error: {result.error}'
+            except RateLimited as e:
+                if e.shed == SHED_DEFER:
+                    return defer_recording(recording, e.retry_after)
+                recording.processing_error = f'Transcription error: {e}'
+            except Exception as e:
+                print("Transcription failed:", e)
+                recording.processing_error = f'Transcription error: {e}'
+
+            wpm = calculate_wpm(transcript, recording.duration_seconds or 0) if transcript else 0
+            previous_wpm = recording.words_per_minute or 0
+            recording.transcript = transcript or ""
+            recording.words_per_minute = wpm
+            if wpm >= previous_wpm:
+                upsert_daily_stat(recording.user_id, recording.created_at.date(),
+                                  wpm_sum=wpm - previous_wpm, wpm_max=wpm)
             else:
-                ai_feedback = str(content).strip()
+                refresh_daily_stat(recording.user_id, recording.created_at.date())
+            recording.articulation_rate = (
+                calculate_articulation_rate(transcript, recording.speech_seconds) if transcript else None
+            )
+            score_recording_reading(recording)
+
+            # A deferred recording comes through here twice; keep one progress row.
+            progress_rows = Progress.query.filter_by(recording_id=recording.id)\
+                .update({"words_per_minute": wpm}, synchronize_session=False)
+            if not progress_rows:
+                db.session.add(Progress(
+                    user_id=recording.user_id,
+                    recording_id=recording.id,
+                    words_per_minute=wpm
+                ))
+            db.session.commit()
+            recording_events.publish(recording.id, {
+                'type': 'transcript',
+                'transcript': recording.transcript,
+                'words_per_minute': wpm,
+            })
+
+            # Fetch AI feedback from transcript and save
+            if transcript and transcript.strip():
+                on_delta = None
+                if recording_events.has_subscribers(recording.id):
+                    # Someone has the result page open: stream the feedback to it
+                    # (on a cache miss, unless it can join a batch; see services.feedback)
+                    def on_delta(text):
+                        recording_events.publish(recording_id, {'type': 'delta', 'text': text})
+                try:
+                    ai_feedback = generate_feedback(
+                        transcript,
+                        recording.duration_seconds or 0,
+                        speech_seconds=recording.speech_seconds,
+                        lesson_id=recording.lesson_id,
+                        lesson_text=recording.lesson.content if recording.lesson else None,
+                        on_delta=on_delta,
+                    )
+                except RateLimited as e:
+                    # The transcript is saved, so the retry goes straight to feedback.
+                    return defer_recording(recording, e.retry_after)
+                if on_delta:
+                    # The final text replaces whatever was streamed (e.g. part of a failed answer)
+                    recording_events.publish(recording_id, {'type': 'feedback', 'text': ai_feedback or ""})
+                if ai_feedback:
+                    recording.ai_feedback = ai_feedback
+                else:
+                    # Fallback feedback if AI did not return anything
+                    recording.ai_feedback = (
+                        "No AI feedback could be generated for this recording. "
+                        "Make sure your audio is clear and long enough (at least a few words)."
+                    )
+            else:
+                # Fallback feedback if transcript is empty
+                recording.ai_feedback = (
+                    "No transcript available, so no AI feedback could be generated. "
+                    "Try speaking more clearly or for longer."
+                )
+            recording.status = "done"
+            db.session.commit()
+            recording_events.publish(recording_id, {'type': 'done', 'status': 'done'})
+        except Exception as e:
+            db.session.rollback()
+            recording = db.session.get(Recording, recording_id)
+            recording.status = "failed"
+            recording.processing_error = str(e)
+            db.session.commit()
+            recording_events.publish(recording_id, {'type': 'done', 'status': 'failed'})
+            raise
+
+def enqueue_recording(recording_id):
+    """Hand a pending recording to the configured job backend."""
+    if JOB_QUEUE_BACKEND == "local":
+        job_queue.submit(recording_id, process_recording, recording_id)
+    # With the "worker" backend the row stays 'pending' until `flask worker` claims it.
+
+def get_or_create_goal(user_id):
+    """The user's goal, created with the default 15 minutes if they have none yet."""
+    goal = Goal.query.filter_by(user_id=user_id).first()
+    if goal is None:
+        goal = Goal(user_id=user_id, daily_minutes=15)
+        db.session.add(goal)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Another request created it first (goal.user_id is unique)
+            db.session.rollback()
+            goal = Goal.query.filter_by(user_id=user_id).first()
+    return goal
+
+def upsert_daily_stat(user_id, day, replace=False, **values):
+    """
+    Add `values` to the user's DailyStat row for `day` (creating it if needed).
+
+    `seconds`, `recordings` and `wpm_sum` are added and `wpm_max` is maxed
+    in; with replace=True they are set instead. A single INSERT ... ON
+    CONFLICT/DUPLICATE KEY statement in the caller's transaction, so
+    concurrent jobs for the same day can't lose each other's updates.
+    """
+    table = DailyStat.__table__
+    row = {"user_id": user_id, "day": day, "seconds": 0, "recordings": 0, "wpm_sum": 0, "wpm_max": 0}
+    row.update(values)
+    mysql = db.engine.dialect.name == "mysql"
+    if mysql:
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(table).values(**row)
+        new, greatest = stmt.inserted, db.func.greatest
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(table).values(**row)
+        new, greatest = stmt.excluded, db.func.max  # SQLite's two-argument max() is scalar
+    if replace:
+        changes = {name: new[name] for name in values}
+    else:
+        changes = {name: table.c[name] + new[name] for name in values if name != "wpm_max"}
+        if "wpm_max" in values:
+            changes["wpm_max"] = greatest(table.c.wpm_max, new.wpm_max)
+    if mysql:
+        stmt = stmt.on_duplicate_key_update(**changes)
+    else:
+        stmt = stmt.on_conflict_do_update(index_elements=[table.c.user_id, table.c.day], set_=changes)
+    db.session.execute(stmt)
+
+def refresh_daily_stat(user_id, day):
+    """Recompute one user-day from its recordings (after a delete, or when a WPM went down)."""
+    db.session.flush()
+    start = datetime.combine(day, datetime.min.time())
+    recordings, seconds, wpm_sum, wpm_max = db.session.query(
+        db.func.count(Recording.id),
+        db.func.sum(Recording.duration_seconds),
+        db.func.sum(Recording.words_per_minute),
+        db.func.max(Recording.words_per_minute),
+    ).filter(Recording.user_id == user_id,
+             Recording.created_at >= start,
+             Recording.created_at < start + timedelta(days=1),
+             Recording.status != "recording").one()
+    if not recordings:
+        DailyStat.query.filter_by(user_id=user_id, day=day).delete()
+        return
+    upsert_daily_stat(user_id, day, replace=True, seconds=seconds or 0, recordings=recordings,
+                      wpm_sum=wpm_sum or 0, wpm_max=wpm_max or 0)
+
+def bump_counter(name, delta=1):
+    """Add `delta` to a SiteCounter in the caller's transaction (one atomic upsert, like upsert_daily_stat)."""
+    table = SiteCounter.__table__
+    if db.engine.dialect.name == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(table).values(name=name, value=delta)
+        stmt = stmt.on_duplicate_key_update(value=table.c.value + stmt.inserted.value)
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(table).values(name=name, value=delta)
+        stmt = stmt.on_conflict_do_update(index_elements=[table.c.name],
+                                          set_={"value": table.c.value + stmt.excluded.value})
+    db.session.execute(stmt)
+
+def bump_review_counters(reviewer_counts, sign=1):
+    """Adjust the review counters for {reviewer_id: reviews} added (sign=1) or deleted (sign=-1)."""
+    total = sum(reviewer_counts.values())
+    if total:
+        bump_counter("reviews", sign * total)
+    for reviewer_id, count in reviewer_counts.items():
+        bump_counter(f"reviews_by:{reviewer_id}", sign * count)
+
+def site_counters(*names):
+    """{name: value} for the given SiteCounters (0 for one never bumped), by primary key."""
+    values = dict(db.session.query(SiteCounter.name, SiteCounter.value)
+                  .filter(SiteCounter.name.in_(names)).all())
+    return {name: values.get(name, 0) for name in names}
+
+def minutes_recorded_on(user_id, day):
+    """Minutes of audio a user recorded on `day` (UTC), from the daily rollup."""
+    stat = db.session.get(DailyStat, (user_id, day))
+    return stat.seconds / 60 if stat else 0
+
+def update_goal_streak(user_id):
+    """Extend (or restart) the user's daily streak for a recording made today."""
+    goal = Goal.query.filter_by(user_id=user_id).first()
+    if goal:
+        today = datetime.utcnow().date()
+        if goal.last_activity_date:
+            yesterday = today - timedelta(days=1)
+            if goal.last_activity_date == yesterday:
+                goal.current_streak += 1
+            elif goal.last_activity_date != today:
+                goal.current_streak = 1
         else:
-            ai_feedback = None
+            goal.current_streak = 1
+        goal.last_activity_date = today
 
-        if not ai_feedback:
-            ai_feedback = (
-                "Good attempt! Focus on clear pronunciation and maintain a steady pace. "
-                "Keep practicing to improve fluency."
-            )
+# Streamed uploads: transcribe finished speech while the student is still recording
+stream_queue = JobQueue(max_workers=STREAM_QUEUE_WORKERS, name="lexistream-stream")
 
-        return ai_feedback
+def transcribe_stream_progress(recording_id):
+    """
+    Transcribe the speech that is already final in a recording being streamed.
 
-    except Exception as e:
-        print("Cohere feedback error:", e)
-        return (
-            "Good attempt! Focus on clear pronunciation and maintain a steady pace. "
-            "Keep practicing to improve fluency."
+    Results are appended to `transcript_segments` with a compare-and-swap
+    update, so if another process got there first (or the upload has been
+    finished meanwhile) this round's work is simply dropped.
+    """
+    with app.app_context():
+        recording = db.session.get(Recording, recording_id)
+        if not recording or recording.status != "recording":
+            return
+        previous = recording.transcript_segments or "[]"
+        committed = json.loads(previous)
+        committed_ms = int(round(committed[-1]["end"] * 1000)) if committed else 0
+
+        engine = get_transcription_engine()
+        filepath = os.path.join(app.config['UPLOAD_FOLDER'], 'recordings', recording.filename)
+        try:
+            # Only what follows the committed segments; the rest was transcribed already
+            audio = load_audio_for_engine(filepath, engine, start_ms=committed_ms)
+        except Exception:
+            return  # not enough of the container has arrived to decode yet
+
+        spans = completed_speech_spans(
+            audio, 0,
+            target_segment_ms=STREAM_SEGMENT_SECONDS * 1000,
+            max_segment_ms=TRANSCRIBE_MAX_SEGMENT_SECONDS * 1000,
+            min_silence_ms=TRANSCRIBE_MIN_SILENCE_MS,
         )
+        if not spans:
+            return
+        limiter = rate_limiters.get(engine.name)
+        if limiter is not None:
+            try:
+                limiter.acquire(len(spans), block=False)
+            except RateLimited:
+                return  # the provider is busy; this audio is transcribed when the upload finishes
+        result = transcribe_segments(audio, spans, engine.transcribe,
+                                     max_workers=TRANSCRIBE_SEGMENT_WORKERS)
+        # Keep segments up to the first failure; the rest is retried later.
+        # Times are relative to the decoded tail, so shift them back into place.
+        done = []
+        for segment in result.segments:
+            if segment.error:
+                break
+            done.append(dict(segment.as_dict(),
+                             start=round((committed_ms + segment.start_ms) / 1000, 2),
+                             end=round((committed_ms + segment.end_ms) / 1000, 2)))
+        if not done:
+            return
+        Recording.query.filter_by(id=recording_id, status="recording", transcript_segments=previous)\
+            .update({"transcript_segments": json.dumps(committed + done)}, synchronize_session=False)
+        db.session.commit()
+
+def requeue_pending_recordings():
+    """Re-submit recordings left pending (e.g. after a restart) to the local pool."""
+    pending_ids = [r.id for r in Recording.query.with_entities(Recording.id)
+                   .filter_by(status="pending").order_by(Recording.id).all()]
+    for recording_id in pending_ids:
+        enqueue_recording(recording_id)
+    return len(pending_ids)
+
+# Process id that has already re-queued pending recordings
+_requeued_in_pid = None
+_requeue_lock = threading.Lock()
 
-def ensure_schema_upgrades():
+@app.before_request
+def requeue_pending_once():
     """
-    Lightweight schema upgrade helper for MySQL.
+    On a process's first request, pick up recordings an earlier process left pending.
 
-    Flask-SQLAlchemy's db.create_all() will NOT alter existing tables.
-    If the database already exists, we add missing columns here.
+    With the "local" backend, queued jobs and defer timers live in the web
+    process, so a restart (e.g. a gunicorn worker being recycled) loses them.
+    Every process does this once; if several submit the same recording,
+    claim_recording() lets only one of them run it.
     """
+    global _requeued_in_pid
+    if JOB_QUEUE_BACKEND != "local" or _requeued_in_pid == os.getpid():
+        return
+    with _requeue_lock:
+        if _requeued_in_pid == os.getpid():
+            return
+        _requeued_in_pid = os.getpid()
     try:
-        inspector = inspect(db.engine)
-        tables = set(inspector.get_table_names())
-        if "user" in tables:
-            cols = {c["name"] for c in inspector.get_columns("user")}
-            alter_statements = []
-            if "is_admin" not in cols:
-                alter_statements.append(
-                    "ALTER TABLE user ADD COLUMN is_admin INTEGER NOT NULL DEFAULT 0"
-                )
-            if "display_name" not in cols:
-                alter_statements.append(
-                    "ALTER TABLE user ADD COLUMN display_name VARCHAR(120)"
-                )
-            if "bio" not in cols:
-                alter_statements.append(
-                    "ALTER TABLE user ADD COLUMN bio TEXT"
-                )
-            if "location" not in cols:
-                alter_statements.append(
-                    "ALTER TABLE user ADD COLUMN location VARCHAR(120)"
-                )
-            if "website" not in cols:
-                alter_statements.append(
-                    "ALTER TABLE user ADD COLUMN website VARCHAR(255)"
-                )
-            if "avatar_url" not in cols:
-                alter_statements.append(
-                    "ALTER TABLE user ADD COLUMN avatar_url VARCHAR(255)"
-                )
-            if "role" not in cols:
-                alter_statements.append(
-                    "ALTER TABLE user ADD COLUMN role VARCHAR(20) NOT NULL DEFAULT 'user'"
-                )
-
-            if alter_statements:
-                with db.engine.begin() as conn:
-                    for stmt in alter_statements:
-                        conn.execute(text(stmt))
-                print("Database upgraded: user table columns synchronized")
-
-        if "recording" in tables:
-            rec_cols = {c["name"] for c in inspector.get_columns("recording")}
-            if "ai_feedback" not in rec_cols:
-                alter = "ALTER TABLE recording ADD COLUMN ai_feedback TEXT"
-                with db.engine.begin() as conn:
-                    conn.execute(text(alter))
-                print("Database upgraded: recording.ai_feedback column added")
+        requeued = requeue_pending_recordings()
     except Exception as e:
-        # Don't crash the app if inspection fails; print a helpful message.
-        print(f"Warning: schema upgrade check failed: {e}")
+        db.session.rollback()
+        print("Could not re-queue pending recordings:", e)
+        return
+    if requeued:
+        print(f"Re-queued {requeued} pending recording(s)")
+
+def create_tables():
+    """
+    Create missing tables from the models. Returns True if the database was new.
+
+    A new database already matches the latest schema, so it is stamped as
+    fully migrated; existing ones are brought up to date with
+    `flask --app app db upgrade` (see services/migrations.py).
+    """
+    is_new = not inspect(db.engine).has_table("user")
+    db.create_all()
+    if is_new:
+        with db.engine.begin() as conn:
+            search.install(conn)  # the full-text index isn't a model, so create_all() can't make it
+        migrations.stamp(db.engine)
+    return is_new
 
 def init_database():
     """Initialize database and create sample data"""
-    db.create_all()
-    ensure_schema_upgrades()
+    if inspect(db.engine).has_table("user"):
+        # An existing database is only checked here; creating tables and
+        # changing the schema is left to `flask --app app db upgrade`.
+        behind = migrations.pending(db.engine)
+        if behind:
+            print(f"Warning: the database schema is {len(behind)} migration(s) behind; "
+                  "run `flask --app app db upgrade`")
+    else:
+        create_tables()
     
     # Create admin user if it doesn't exist
     admin = User.query.filter_by(username='admin').first()
@@ -298,6 +791,7 @@ def init_database():
             role="admin"
         )
         db.session.add(admin)
+        bump_counter("users")
         db.session.commit()
         print("Admin user created!")
     
@@ -342,6 +836,7 @@ def init_database():
         ]
         for lesson in sample_lessons:
             db.session.add(lesson)
+        bump_counter("lessons", len(sample_lessons))
         db.session.commit()
         print("Sample lessons created!")
 
@@ -399,6 +894,7 @@ def register():
             password_hash=generate_password_hash(password)
         )
         db.session.add(user)
+        bump_counter("users")
         db.session.commit()
         
         # Create default goal
@@ -443,26 +939,59 @@ def dashboard():
     
     # Get recent progress data
     progress_data = Progress.query.filter_by(user_id=current_user.id)\
-        .order_by(Progress.date.desc()).limit(30).all()
+        .order_by(Progress.date.desc()).limit(5).all()
+    total_recordings = db.session.query(db.func.sum(DailyStat.recordings))\
+        .filter_by(user_id=current_user.id).scalar() or 0
     
     # Get goal info
-    goal = Goal.query.filter_by(user_id=current_user.id).first()
-    if not goal:
-        goal = Goal(user_id=current_user.id, daily_minutes=15)
-        db.session.add(goal)
-        db.session.commit()
+    goal = get_or_create_goal(current_user.id)
     
     # Calculate today's minutes
-    today = datetime.utcnow().date()
-    today_recordings = Recording.query.filter_by(user_id=current_user.id)\
-        .filter(db.func.date(Recording.created_at) == today).all()
-    today_minutes = sum(r.duration_seconds for r in today_recordings) / 60
+    today_minutes = minutes_recorded_on(current_user.id, datetime.utcnow().date())
     
     return render_template('dashboard.html', 
                          progress_data=progress_data,
+                         total_recordings=total_recordings,
                          goal=goal,
                          today_minutes=round(today_minutes, 2))
 
+def lesson_id_from(lesson_id):
+    """`lesson_id` (from a form or query string) if it names a lesson, else None."""
+    if lesson_id and db.session.get(Lesson, lesson_id):
+        return lesson_id
+    return None
+
+def upload_extension(info):
+    """File extension for a probed upload (MP4 audio is stored as .m4a)."""
+    return {"mp4": "m4a"}.get(info.format, info.format)
+
+def probe_saved_upload(filepath, client_duration):
+    """
+    Audio info for an upload whose container probe_audio() doesn't know.
+
+    Asks ffprobe (bounded by PROBE_TIMEOUT_SECONDS); without it, trusts the
+    browser's duration, capped at MAX_RECORDING_SECONDS. A file that isn't
+    audio at all then fails at transcription, like the baseline did.
+    """
+    try:
+        return ffprobe_audio(filepath, timeout=PROBE_TIMEOUT_SECONDS)
+    except ProbeError as e:
+        print(f"Could not probe {filepath} ({e}); using the browser's duration")
+        return AudioInfo(format=None, duration=min(client_duration or 0, MAX_RECORDING_SECONDS))
+
+def recording_too_long_message(info):
+    if info.duration and info.duration > MAX_RECORDING_SECONDS:
+        return (f'Recording is too long ({info.duration / 60:.1f} min). '
+                f'Please keep recordings under {MAX_RECORDING_SECONDS // 60} minutes.')
+    return None
+
+@app.errorhandler(413)
+def upload_too_large(e):
+    flash(f'Recording file is too large (max {MAX_CONTENT_LENGTH // (1024 * 1024)}MB).')
+    if request.path.startswith('/record/stream/'):
+        return jsonify({'error': 'recording too large'}), 413
+    return redirect(url_for('record'))
+
 @app.route('/record', methods=['GET', 'POST'])
 @login_required
 def record():
@@ -477,91 +1006,220 @@ def record():
             return redirect(url_for('record'))
 
         if file and allowed_file(file.filename):
-            # IMPORTANT: keep extension consistent with what browser sends
+            # Read duration/format from the container headers before anything
+            # touches the disk; the form's duration is only a fallback.
+            try:
+                info = probe_audio(file.stream)
+            except ProbeError:
+                info = None  # an unfamiliar container; probed again once saved
+            too_long = recording_too_long_message(info) if info else None
+            if too_long:
+                flash(too_long)
+                return redirect(url_for('record'))
+
+            # Name the file after its real container so decoding picks the right demuxer
+            extension = upload_extension(info) if info else file.filename.rsplit('.', 1)[1].lower()
             filename = secure_filename(
-                f"{current_user.id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.webm"
+                f"{current_user.id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
             )
 
             filepath = os.path.join(app.config['UPLOAD_FOLDER'], 'recordings', filename)
             file.save(filepath)
-
-            duration = request.form.get('duration', 0, type=float)
-
-            transcript = None
-            try:
-                transcript, error = transcribe_audio(filepath)
-                if error:
-                    flash(f'Transcription error: {error}')
-            except Exception as e:
-                print("Transcription failed:", e)
-
-            wpm = calculate_wpm(transcript, duration) if transcript else 0
-
-            # SAVE RECORDING FIRST
+            if info is None:
+                info = probe_saved_upload(filepath, request.form.get('duration', type=float))
+                too_long = recording_too_long_message(info)
+                if too_long:
+                    os.remove(filepath)
+                    flash(too_long)
+                    return redirect(url_for('record'))
+
+            duration = info.duration or request.form.get('duration', 0, type=float)
+
+            # Transcription and AI feedback run in the background; the
+            # result page polls until they are filled in.
             recording = Recording(
                 user_id=current_user.id,
+                lesson_id=lesson_id_from(request.form.get('lesson_id', type=int)),
                 filename=filename,
-                transcript=transcript or "",
-                words_per_minute=wpm,
-                duration_seconds=duration
+                transcript="",
+                words_per_minute=0,
+                duration_seconds=duration,
+                status="pending"
             )
             db.session.add(recording)
-            db.session.flush()  # ← THIS LINE FIXES THE DB ISSUE
-
-            # NOW recording.id EXISTS
-            progress = Progress(
-                user_id=current_user.id,
-                recording_id=recording.id,
-                words_per_minute=wpm
-            )
-            db.session.add(progress)
-
-            # Update goal streak
-            goal = Goal.query.filter_by(user_id=current_user.id).first()
-            if goal:
-                today = datetime.utcnow().date()
-                if goal.last_activity_date:
-                    yesterday = today - timedelta(days=1)
-                    if goal.last_activity_date == yesterday:
-                        goal.current_streak += 1
-                    elif goal.last_activity_date != today:
-                        goal.current_streak = 1
-                else:
-                    goal.current_streak = 1
-                goal.last_activity_date = today
+            db.session.flush()
+            upsert_daily_stat(current_user.id, recording.created_at.date(),
+                              seconds=duration or 0, recordings=1)
+            bump_counter("recordings")
 
+            update_goal_streak(current_user.id)
             db.session.commit()
+            enqueue_recording(recording.id)
 
-            # Fetch AI feedback from transcript and save
-            if transcript and transcript.strip():
-                ai_feedback = get_ai_feedback(transcript)
-                if ai_feedback:
-                    recording.ai_feedback = ai_feedback
-                else:
-                    # Fallback feedback if AI did not return anything
-                    recording.ai_feedback = (
-                        "No AI feedback could be generated for this recording. "
-                        "Make sure your audio is clear and long enough (at least a few words)."
-                    )
-                db.session.commit()
-            else:
-                # Fallback feedback if transcript is empty
-                recording.ai_feedback = (
-                    "No transcript available, so no AI feedback could be generated. "
-                    "Try speaking more clearly or for longer."
-                )
-                db.session.commit()
+            flash('Recording saved! Your transcript and feedback are being prepared.')
+            return redirect(url_for('recording_result', recording_id=recording.id))
 
+    lesson_id = lesson_id_from(request.args.get('lesson_id', type=int))
+    lesson = db.session.get(Lesson, lesson_id) if lesson_id else None
+    return render_template('record.html', lesson=lesson)
 
-            flash('Recording saved successfully!')
-            return redirect(url_for('recording_result', recording_id=recording.id))
+def recording_upload_path(recording):
+    return os.path.join(app.config['UPLOAD_FOLDER'], 'recordings', recording.filename)
+
+_last_stream_sweep = 0.0
 
-    return render_template('record.html')
+def sweep_abandoned_streams(force=False):
+    """
+    Delete streamed uploads that never finished (tab closed, connection lost).
+
+    Such rows stay in status "recording" and are counted nowhere; after
+    STREAM_ABANDONED_SECONDS they and their partial files are removed. Runs
+    at most once per STREAM_SWEEP_INTERVAL_SECONDS in each process unless
+    `force` is set. Returns how many were removed.
+    """
+    global _last_stream_sweep
+    now = time.time()
+    if not force and now - _last_stream_sweep < STREAM_SWEEP_INTERVAL_SECONDS:
+        return 0
+    _last_stream_sweep = now
+    cutoff = datetime.utcnow() - timedelta(seconds=STREAM_ABANDONED_SECONDS)
+    stale = Recording.query.options(db.load_only(Recording.id, Recording.filename))\
+        .filter(Recording.status == "recording", Recording.created_at < cutoff).all()
+    for recording in stale:
+        filepath = recording_upload_path(recording)
+        if os.path.exists(filepath):
+            os.remove(filepath)
+        db.session.delete(recording)
+    db.session.commit()
+    return len(stale)
+
+def get_streaming_recording(recording_id):
+    """The current user's recording that is still receiving chunks, or None."""
+    recording = db.session.get(Recording, recording_id)
+    if not recording or recording.user_id != current_user.id or recording.status != "recording":
+        return None
+    return recording
+
+@app.route('/record/stream/start', methods=['POST'])
+@login_required
+def record_stream_start():
+    """Open a chunked upload; MediaRecorder chunks are appended as they arrive."""
+    sweep_abandoned_streams()
+    filename = secure_filename(
+        f"{current_user.id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.webm"
+    )
+    recording = Recording(
+        user_id=current_user.id,
+        lesson_id=lesson_id_from(request.args.get('lesson_id', type=int)),
+        filename=filename,
+        transcript="",
+        transcript_segments="[]",
+        words_per_minute=0,
+        duration_seconds=0,
+        status="recording"
+    )
+    # Not counted (SiteCounter, DailyStat) until it is finished
+    db.session.add(recording)
+    db.session.commit()
+    open(recording_upload_path(recording), 'wb').close()
+    return jsonify({
+        'recording_id': recording.id,
+        'chunk_url': url_for('record_stream_chunk', recording_id=recording.id),
+        'finish_url': url_for('record_stream_finish', recording_id=recording.id),
+        'abort_url': url_for('record_stream_abort', recording_id=recording.id),
+    })
+
+@app.route('/record/stream/<int:recording_id>/chunk', methods=['POST'])
+@login_required
+def record_stream_chunk(recording_id):
+    """
+    Append one chunk at byte `offset`.
+
+    Re-sent chunks (offset already written) are acknowledged without being
+    written twice; a gap means a chunk went missing and is rejected.
+    """
+    recording = get_streaming_recording(recording_id)
+    if recording is None:
+        return jsonify({'error': 'upload not found'}), 404
+
+    offset = request.args.get('offset', type=int)
+    data = request.get_data()
+    filepath = recording_upload_path(recording)
+    size = os.path.getsize(filepath)
+    if offset is None or offset > size:
+        return jsonify({'error': 'unexpected offset', 'size': size}), 409
+    if offset + len(data) > app.config['MAX_CONTENT_LENGTH']:
+        return jsonify({'error': 'recording too large'}), 413
+
+    new_data = data[size - offset:]
+    if new_data:
+        with open(filepath, 'ab') as f:
+            f.write(new_data)
+        stream_queue.submit(recording_id, transcribe_stream_progress, recording_id)
+    return jsonify({'size': size + len(new_data)})
+
+@app.route('/record/stream/<int:recording_id>/finish', methods=['POST'])
+@login_required
+def record_stream_finish(recording_id):
+    """Close a chunked upload and queue the remaining transcription + feedback."""
+    recording = get_streaming_recording(recording_id)
+    if recording is None:
+        return jsonify({'error': 'upload not found'}), 404
+    filepath = recording_upload_path(recording)
+    try:
+        info = probe_audio(filepath)
+        known_container = True
+    except ProbeError:
+        info = probe_saved_upload(filepath, request.form.get('duration', type=float))
+        known_container = False
+    too_long = recording_too_long_message(info)
+    if too_long:
+        # Drop the stream; the browser falls back to the regular form upload,
+        # which reports the problem to the student.
+        db.session.delete(recording)
+        db.session.commit()
+        os.remove(filepath)
+        return jsonify({'error': too_long}), 400
+
+    # Streams start out as .webm, but Firefox records Ogg/Opus: name the
+    # file after its real container, like record() does for form uploads.
+    if known_container:
+        filename = f"{os.path.splitext(recording.filename)[0]}.{upload_extension(info)}"
+        if filename != recording.filename:
+            os.rename(filepath, os.path.join(os.path.dirname(filepath), filename))
+            recording.filename = filename
+
+    recording.duration_seconds = info.duration or request.form.get('duration', 0, type=float)
+    recording.status = "pending"
+    upsert_daily_stat(current_user.id, recording.created_at.date(),
+                      seconds=recording.duration_seconds or 0, recordings=1)
+    bump_counter("recordings")
+    update_goal_streak(current_user.id)
+    db.session.commit()
+    enqueue_recording(recording.id)
+
+    flash('Recording saved! Your transcript and feedback are being prepared.')
+    return jsonify({'redirect_url': url_for('recording_result', recording_id=recording.id)})
+
+@app.route('/record/stream/<int:recording_id>/abort', methods=['POST'])
+@login_required
+def record_stream_abort(recording_id):
+    """Throw away a chunked upload the browser gave up on (it re-sends the recording as a form upload)."""
+    recording = get_streaming_recording(recording_id)
+    if recording is None:
+        return jsonify({'error': 'upload not found'}), 404
+    filepath = recording_upload_path(recording)
+    db.session.delete(recording)
+    db.session.commit()
+    if os.path.exists(filepath):
+        os.remove(filepath)
+    return jsonify({'aborted': True})
 
 @app.route('/recordings')
 @login_required
 def recordings():
     recordings_list = Recording.query.filter_by(user_id=current_user.id)\
+        .filter(Recording.status != "recording")\
         .order_by(Recording.created_at.desc()).all()
     return render_template('recordings.html', recordings=recordings_list)
 
@@ -573,7 +1231,87 @@ def recording_result(recording_id):
     if recording.user_id != current_user.id:
         flash('You can only view your own recordings.')
         return redirect(url_for('recordings'))
-    return render_template('recording_result.html', recording=recording)
+    alignment = None
+    if recording.lesson and recording.transcript and recording.status == "done":
+        alignment = align_to_lesson(recording.transcript, recording.lesson.content)
+    return render_template('recording_result.html', recording=recording, alignment=alignment)
+
+@app.route('/recording/<int:recording_id>/status')
+@login_required
+def recording_status(recording_id):
+    """JSON job state polled by the result page while a recording is processed."""
+    recording = Recording.query.get_or_404(recording_id)
+    if recording.user_id != current_user.id:
+        return jsonify({'error': 'forbidden'}), 403
+    return jsonify({
+        'id': recording.id,
+        'status': recording.status,
+        'transcript': recording.transcript,
+        'words_per_minute': recording.words_per_minute,
+        'articulation_rate': recording.articulation_rate,
+        'speech_seconds': recording.speech_seconds,
+        'reading_accuracy': recording.reading_accuracy,
+        'reading_wer': recording.reading_wer,
+        'ai_feedback': recording.ai_feedback,
+        'error': recording.processing_error,
+    })
+
+@app.route('/recording/<int:recording_id>/events')
+@login_required
+def recording_events_stream(recording_id):
+    """
+    Server-sent events for the result page while a recording is processed.
+
+    Sends `transcript` when the transcript is ready, `delta` events with AI
+    feedback text as Cohere streams it, `feedback` with the final text
+    (which replaces the streamed one) and `done` once everything is saved.
+    Events come from jobs in this process; jobs in a separate worker are
+    noticed by re-checking the database every couple of seconds.
+
+    Each response ends after EVENTS_STREAM_SECONDS (or on `done`) so a web
+    worker is never tied up for a whole job; the browser's EventSource
+    reconnects by itself after `retry` milliseconds.
+    """
+    recording = Recording.query.get_or_404(recording_id)
+    if recording.user_id != current_user.id:
+        return jsonify({'error': 'forbidden'}), 403
+
+    def sse(event):
+        return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+    def current_status():
+        status = db.session.query(Recording.status).filter_by(id=recording_id).scalar()
+        db.session.rollback()  # end the transaction so the next check sees new commits
+        return status
+
+    @stream_with_context
+    def generate():
+        # Subscribe before the first check so nothing published in between is lost.
+        events = recording_events.subscribe(recording_id)
+        try:
+            yield f"retry: {EVENTS_RECONNECT_MS}\n\n"
+            status = current_status()
+            deadline = time.monotonic() + EVENTS_STREAM_SECONDS
+            while status in ("pending", "processing"):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return  # the client reconnects and picks up from the current state
+                try:
+                    event = events.get(timeout=min(2, remaining))
+                except queue.Empty:
+                    status = current_status()
+                    yield ": keep-alive\n\n"
+                    continue
+                yield sse(event)
+                if event['type'] == 'done':
+                    return
+            if status not in ("pending", "processing"):
+                yield sse({'type': 'done', 'status': status})
+        finally:
+            recording_events.unsubscribe(recording_id, events)
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/lessons')
 @login_required
@@ -588,22 +1326,106 @@ def lessons():
 @app.route('/progress')
 @login_required
 def progress():
-    progress_data = Progress.query.filter_by(user_id=current_user.id)\
-        .order_by(Progress.date.asc()).all()
-    
-    chart_data = {
-        'dates': [p.date.strftime('%Y-%m-%d') for p in progress_data],
-        'wpm': [p.words_per_minute for p in progress_data]
+    # Totals come from the daily rollup; the chart fetches its points from progress_data()
+    sessions, wpm_sum, highest, slowest = db.session.query(
+        db.func.sum(DailyStat.recordings),
+        db.func.sum(DailyStat.wpm_sum),
+        db.func.max(DailyStat.wpm_max),
+        db.func.min(DailyStat.wpm_sum / DailyStat.recordings),
+    ).filter(DailyStat.user_id == current_user.id).one()
+    summary = {
+        'sessions': sessions or 0,
+        'average_wpm': wpm_sum / sessions if sessions else 0,
+        'highest_wpm': highest or 0,
+        'slowest_day_wpm': round(slowest or 0, 2),
     }
     
-    return render_template('progress.html', chart_data=chart_data)
+    return render_template('progress.html', summary=summary,
+                           chart_points=PROGRESS_CHART_POINTS)
+
+CHART_BUCKETS = ("day", "week", "month")
+
+def chart_bucket_start(bucket):
+    """SQL expression for the first day of the day/week/month (weeks start Monday) a DailyStat falls in."""
+    day = DailyStat.day
+    mysql = db.engine.dialect.name == "mysql"
+    if bucket == "week":
+        return db.func.subdate(day, db.func.weekday(day)) if mysql else db.func.date(day, "weekday 0", "-6 days")
+    if bucket == "month":
+        return db.func.date_format(day, "%Y-%m-01") if mysql else db.func.strftime("%Y-%m-01", day)
+    return day
+
+def bucket_start_of(day, bucket):
+    """The same bucket start as chart_bucket_start(), for a date in Python."""
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())
+    if bucket == "month":
+        return day.replace(day=1)
+    return day
+
+@app.route('/progress/data')
+@login_required
+def progress_data():
+    """
+    JSON points for the progress chart: average WPM per day, week or month.
+
+    `bucket` is day, week or month; `points` caps how many are returned
+    (more are downsampled with LTTB, keeping peaks and dips); `since`
+    (YYYY-MM-DD) only returns buckets from the one holding that date on, so
+    the chart can fetch what is new and replace its last point.
+    """
+    bucket = request.args.get('bucket', 'day')
+    if bucket not in CHART_BUCKETS:
+        return jsonify({'error': 'bucket must be day, week or month'}), 400
+    target = min(request.args.get('points', PROGRESS_CHART_POINTS, type=int), PROGRESS_CHART_MAX_POINTS)
+    since = request.args.get('since')
+    
+    start = chart_bucket_start(bucket).label('bucket_start')
+    query = db.session.query(
+        start,
+        db.func.sum(DailyStat.recordings),
+        db.func.sum(DailyStat.wpm_sum),
+        db.func.max(DailyStat.wpm_max),
+        db.func.sum(DailyStat.seconds),
+    ).filter(DailyStat.user_id == current_user.id)
+    if since:
+        try:
+            since_day = datetime.strptime(since, '%Y-%m-%d').date()
+        except ValueError:
+            return jsonify({'error': 'since must be a date (YYYY-MM-DD)'}), 400
+        query = query.filter(DailyStat.day >= bucket_start_of(since_day, bucket))
+    rows = query.group_by(start).order_by(start).all()
+    
+    points = [{
+        'date': str(first_day)[:10],
+        'wpm': round(wpm_sum / sessions, 2) if sessions else 0,
+        'best_wpm': best or 0,
+        'sessions': sessions,
+        'minutes': round((seconds or 0) / 60, 1),
+    } for first_day, sessions, wpm_sum, best, seconds in rows]
+    if len(points) > target:
+        xy = [(datetime.strptime(p['date'], '%Y-%m-%d').toordinal(), p['wpm']) for p in points]
+        points = [points[i] for i in lttb(xy, target)]
+    return jsonify({'bucket': bucket, 'buckets': len(rows), 'points': points})
 
 @app.route('/reviews')
 @login_required
 def reviews():
-    # Get all public recordings (for now, all recordings)
-    all_recordings = Recording.query.order_by(Recording.created_at.desc()).limit(50).all()
-    my_reviews = Review.query.filter_by(reviewer_id=current_user.id).all()
+    # Get all public recordings (for now, all recordings), each with its
+    # author and review count in the same query instead of two per row
+    review_count = db.select(db.func.count(Review.id))\
+        .where(Review.recording_id == Recording.id)\
+        .correlate(Recording).scalar_subquery()
+    all_recordings = db.session.query(Recording, review_count)\
+        .options(
+            db.load_only(Recording.id, Recording.user_id, Recording.transcript,
+                         Recording.words_per_minute, Recording.created_at),
+            db.joinedload(Recording.user).load_only(User.username),
+        )\
+        .filter(Recording.status != "recording")\
+        .order_by(Recording.created_at.desc()).limit(50).all()
+    my_reviews = Review.query.options(db.load_only(Review.id, Review.recording_id))\
+        .filter_by(reviewer_id=current_user.id).all()
     return render_template('reviews.html', recordings=all_recordings, my_reviews=my_reviews)
 
 @app.route('/review/<int:recording_id>', methods=['GET', 'POST'])
@@ -620,6 +1442,7 @@ def review_recording(recording_id):
                 feedback_text=feedback
             )
             db.session.add(review)
+            bump_review_counters({current_user.id: 1})
             db.session.commit()
             flash('Review submitted successfully!')
             return redirect(url_for('reviews'))
@@ -674,30 +1497,18 @@ def delete_vocabulary(vocab_id):
 @app.route('/goals', methods=['GET', 'POST'])
 @login_required
 def goals():
-    goal = Goal.query.filter_by(user_id=current_user.id).first()
+    goal = get_or_create_goal(current_user.id)
     
     if request.method == 'POST':
         daily_minutes = request.form.get('daily_minutes', type=int)
         if daily_minutes and daily_minutes > 0:
-            if goal:
-                goal.daily_minutes = daily_minutes
-            else:
-                goal = Goal(user_id=current_user.id, daily_minutes=daily_minutes)
-                db.session.add(goal)
+            goal.daily_minutes = daily_minutes
             db.session.commit()
             flash('Goal updated successfully!')
             return redirect(url_for('goals'))
     
-    if not goal:
-        goal = Goal(user_id=current_user.id, daily_minutes=15)
-        db.session.add(goal)
-        db.session.commit()
-    
     # Calculate today's progress
-    today = datetime.utcnow().date()
-    today_recordings = Recording.query.filter_by(user_id=current_user.id)\
-        .filter(db.func.date(Recording.created_at) == today).all()
-    today_minutes = sum(r.duration_seconds for r in today_recordings) / 60
+    today_minutes = minutes_recorded_on(current_user.id, datetime.utcnow().date())
     
     return render_template('goals.html', goal=goal, today_minutes=round(today_minutes, 2))
 
@@ -759,6 +1570,49 @@ def edit_profile():
     return render_template('profile_edit.html', user=current_user)
 
 # Admin Routes
+def filter_created_between(query, model, filters):
+    """Apply the `from`/`to` (YYYY-MM-DD, inclusive) query-string filters on created_at."""
+    for name in ('from', 'to'):
+        value = request.args.get(name, '')
+        try:
+            day = datetime.strptime(value, '%Y-%m-%d')
+        except ValueError:
+            continue
+        filters[name] = value
+        if name == 'from':
+            query = query.filter(model.created_at >= day)
+        else:
+            query = query.filter(model.created_at < day + timedelta(days=1))
+    return query
+
+admin_count_cache = PersistentCache(
+    CACHE_DB_PATH, "admin_counts",
+    max_entries=1000,
+    ttl_seconds=ADMIN_COUNT_CACHE_SECONDS,
+)
+
+def estimate_count(query, table_name, filters):
+    """
+    Approximate number of rows for an admin list, without a COUNT(*) per page view.
+
+    Unfiltered lists on MySQL use InnoDB's table statistics; anything else
+    is counted once and reused for ADMIN_COUNT_CACHE_SECONDS.
+    """
+    if not filters and db.engine.dialect.name == "mysql":
+        estimate = db.session.execute(
+            text("SELECT TABLE_ROWS FROM information_schema.TABLES "
+                 "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table"),
+            {"table": table_name},
+        ).scalar()
+        if estimate is not None:
+            return estimate
+    key = f"{table_name}:{json.dumps(filters, sort_keys=True)}"
+    count = admin_count_cache.get(key)
+    if count is None:
+        count = query.order_by(None).count()
+        admin_count_cache.set(key, count)
+    return count
+
 def admin_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -792,22 +1646,38 @@ def teacher_or_admin_required(f):
 @login_required
 @admin_required
 def admin_dashboard():
-    total_users = User.query.count()
-    total_recordings = Recording.query.count()
-    total_lessons = Lesson.query.count()
-    total_reviews = Review.query.count()
+    # Totals are kept in SiteCounter; the recent lists read the newest few rows off the (created_at, id) indexes
+    totals = site_counters("users", "recordings", "lessons", "reviews")
     
-    recent_users = User.query.order_by(User.created_at.desc()).limit(5).all()
-    recent_recordings = Recording.query.order_by(Recording.created_at.desc()).limit(5).all()
+    recent_users = User.query.options(db.load_only(User.username, User.email, User.created_at))\
+        .order_by(User.created_at.desc(), User.id.desc()).limit(5).all()
+    recent_recordings = Recording.query.filter(Recording.status != "recording").options(
+        db.load_only(Recording.id, Recording.user_id, Recording.words_per_minute, Recording.created_at),
+        db.joinedload(Recording.user).load_only(User.username),
+    ).order_by(Recording.created_at.desc(), Recording.id.desc()).limit(5).all()
     
     return render_template('admin/dashboard.html',
-                         total_users=total_users,
-                         total_recordings=total_recordings,
-                         total_lessons=total_lessons,
-                         total_reviews=total_reviews,
+                         total_users=totals["users"],
+                         total_recordings=totals["recordings"],
+                         total_lessons=totals["lessons"],
+                         total_reviews=totals["reviews"],
                          recent_users=recent_users,
                          recent_recordings=recent_recordings)
 
+@app.route('/admin/metrics')
+@login_required
+@admin_required
+def admin_metrics():
+    """Process-local pipeline metrics (audio bytes per stage, job queue, ...)."""
+    metrics.set_gauge("jobs.queue_depth", job_queue.depth())
+    metrics.set_gauge("cache.transcripts.size", transcript_cache.size())
+    metrics.set_gauge("cache.feedback.size", feedback_cache.size())
+    metrics.set_gauge("cache.feedback.hit_rate", feedback_cache.stats()["hit_rate"])
+    for provider, limiter in rate_limiters.items():
+        # Read from the shared bucket, so this counts waiters in every process.
+        metrics.set_gauge(f"ratelimit.{provider}.queue_depth", limiter.queue_depth())
+    return jsonify(metrics.snapshot())
+
 @app.route('/admin/lessons')
 @login_required
 @teacher_or_admin_required
@@ -827,6 +1697,7 @@ def admin_add_lesson():
         if title and content and difficulty:
             lesson = Lesson(title=title, content=content, difficulty=difficulty)
             db.session.add(lesson)
+            bump_counter("lessons")
             db.session.commit()
             flash('Lesson added successfully!')
             return redirect(url_for('admin_lessons'))
@@ -854,7 +1725,10 @@ def admin_edit_lesson(lesson_id):
 @teacher_or_admin_required
 def admin_delete_lesson(lesson_id):
     lesson = Lesson.query.get_or_404(lesson_id)
+    # Keep recordings of this lesson; they just no longer point at it
+    Recording.query.filter_by(lesson_id=lesson_id).update({"lesson_id": None}, synchronize_session=False)
     db.session.delete(lesson)
+    bump_counter("lessons", -1)
     db.session.commit()
     flash('Lesson deleted successfully!')
     return redirect(url_for('admin_lessons'))
@@ -863,8 +1737,26 @@ def admin_delete_lesson(lesson_id):
 @login_required
 @admin_required
 def admin_users():
-    users = User.query.order_by(User.created_at.desc()).all()
-    return render_template('admin/users.html', users=users)
+    filters = {}
+    query = User.query
+    search = request.args.get('q', '').strip()
+    if search:
+        # Prefix match, so the unique username/email indexes can be used
+        filters['q'] = search
+        pattern = search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        query = query.filter(db.or_(User.username.like(pattern, escape='\\'),
+                                    User.email.like(pattern, escape='\\')))
+    role = request.args.get('role', '')
+    if role in ("admin", "teacher", "user"):
+        filters['role'] = role
+        query = query.filter(User.role == role)
+    query = filter_created_between(query, User, filters)
+
+    page = keyset_page(query, User.created_at, User.id,
+                       after=request.args.get('after'), before=request.args.get('before'),
+                       per_page=ADMIN_PAGE_SIZE)
+    total = estimate_count(query, "user", filters)
+    return render_template('admin/users.html', users=page.items, page=page, total=total, filters=filters)
 
 @app.route('/admin/users/edit/<int:user_id>', methods=['GET', 'POST'])
 @login_required
@@ -928,14 +1820,21 @@ def admin_delete_user(user_id):
         flash('Cannot delete admin user')
         return redirect(url_for('admin_users'))
     
-    # Delete user's data
+    # Delete user's data (unfinished streamed uploads were never counted)
+    deleted_recordings = Recording.query.filter_by(user_id=user_id)\
+        .filter(Recording.status != "recording").count()
     Recording.query.filter_by(user_id=user_id).delete()
     Progress.query.filter_by(user_id=user_id).delete()
     Vocabulary.query.filter_by(user_id=user_id).delete()
     Goal.query.filter_by(user_id=user_id).delete()
-    Review.query.filter_by(reviewer_id=user_id).delete()
+    DailyStat.query.filter_by(user_id=user_id).delete()
+    deleted_reviews = Review.query.filter_by(reviewer_id=user_id).delete()
     
     db.session.delete(user)
+    bump_counter("users", -1)
+    bump_counter("recordings", -deleted_recordings)
+    bump_counter("reviews", -deleted_reviews)
+    SiteCounter.query.filter_by(name=f"reviews_by:{user_id}").delete()
     db.session.commit()
     flash('User deleted successfully!')
     return redirect(url_for('admin_users'))
@@ -944,8 +1843,36 @@ def admin_delete_user(user_id):
 @login_required
 @admin_required
 def admin_recordings():
-    recordings = Recording.query.order_by(Recording.created_at.desc()).all()
-    return render_template('admin/recordings.html', recordings=recordings)
+    filters = {}
+    query = Recording.query.filter(Recording.status != "recording")  # not uploads still streaming
+    username = request.args.get('user', '').strip()
+    if username:
+        filters['user'] = username
+        user_id = db.session.query(User.id).filter_by(username=username).scalar()
+        query = query.filter(Recording.user_id == user_id) if user_id else query.filter(db.false())
+    min_wpm = request.args.get('min_wpm', type=float)
+    if min_wpm is not None:
+        filters['min_wpm'] = min_wpm
+        query = query.filter(Recording.words_per_minute >= min_wpm)
+    max_wpm = request.args.get('max_wpm', type=float)
+    if max_wpm is not None:
+        filters['max_wpm'] = max_wpm
+        query = query.filter(Recording.words_per_minute <= max_wpm)
+    query = filter_created_between(query, Recording, filters)
+
+    page = keyset_page(
+        query.options(
+            db.load_only(Recording.id, Recording.user_id, Recording.words_per_minute,
+                         Recording.duration_seconds, Recording.transcript, Recording.created_at),
+            db.joinedload(Recording.user).load_only(User.username),
+        ),
+        Recording.created_at, Recording.id,
+        after=request.args.get('after'), before=request.args.get('before'),
+        per_page=ADMIN_PAGE_SIZE,
+    )
+    total = estimate_count(query, "recording", filters)
+    return render_template('admin/recordings.html', recordings=page.items, page=page, total=total,
+                           filters=filters)
 
 @app.route('/admin/recordings/delete/<int:recording_id>')
 @login_required
@@ -953,35 +1880,298 @@ def admin_recordings():
 def admin_delete_recording(recording_id):
     recording = Recording.query.get_or_404(recording_id)
     
-    # Delete file if exists
-    filepath = os.path.join(app.config['UPLOAD_FOLDER'], 'recordings', recording.filename)
-    if os.path.exists(filepath):
-        os.remove(filepath)
+    # Delete files if they exist (the normalized recording and any kept original)
+    for name in (recording.filename, recording.original_filename):
+        filepath = os.path.join(app.config['UPLOAD_FOLDER'], 'recordings', name) if name else None
+        if filepath and os.path.exists(filepath):
+            os.remove(filepath)
     
     # Delete reviews
+    reviewer_counts = dict(db.session.query(Review.reviewer_id, db.func.count(Review.id))
+                           .filter_by(recording_id=recording_id).group_by(Review.reviewer_id).all())
     Review.query.filter_by(recording_id=recording_id).delete()
+    bump_review_counters(reviewer_counts, sign=-1)
     Progress.query.filter_by(recording_id=recording_id).delete()
     
     db.session.delete(recording)
+    if recording.status != "recording":
+        bump_counter("recordings", -1)
+    if recording.created_at:
+        refresh_daily_stat(recording.user_id, recording.created_at.date())
     db.session.commit()
     flash('Recording deleted successfully!')
     return redirect(url_for('admin_recordings'))
 
+@app.route('/admin/search')
+@login_required
+@teacher_or_admin_required
+def admin_search():
+    """Ranked full-text search over recording transcripts and AI feedback (see services/search.py)."""
+    q = request.args.get('q', '').strip()
+    query = search.parse_query(q)
+    page = max(request.args.get('page', 1, type=int), 1)
+    results, has_next = [], False
+    if query:
+        ids = search.search_recording_ids(db.session, query, limit=SEARCH_PAGE_SIZE + 1,
+                                          offset=(page - 1) * SEARCH_PAGE_SIZE)
+        has_next = len(ids) > SEARCH_PAGE_SIZE
+        ids = ids[:SEARCH_PAGE_SIZE]
+        found = {r.id: r for r in Recording.query.options(
+            db.load_only(Recording.id, Recording.user_id, Recording.words_per_minute,
+                         Recording.transcript, Recording.ai_feedback, Recording.created_at),
+            db.joinedload(Recording.user).load_only(User.username),
+        ).filter(Recording.id.in_(ids))}
+        results = [(found[i], *search.snippet(found[i].transcript, found[i].ai_feedback, query))
+                   for i in ids if i in found]
+    return render_template('admin/search.html', q=q, results=results, page=page, has_next=has_next)
+
 @app.route('/teacher/dashboard')
 @login_required
 @teacher_required
 def teacher_dashboard():
-    total_lessons = Lesson.query.count()
-    total_users = User.query.count()
-    my_reviews = Review.query.filter_by(reviewer_id=current_user.id).count()
-    recent_users = User.query.order_by(User.created_at.desc()).limit(5).all()
+    my_reviews = f"reviews_by:{current_user.id}"
+    totals = site_counters("lessons", "users", my_reviews)
+    recent_users = User.query.options(db.load_only(User.username, User.email, User.created_at))\
+        .order_by(User.created_at.desc(), User.id.desc()).limit(5).all()
 
     return render_template('teacher_dashboard.html',
-                           total_lessons=total_lessons,
-                           total_users=total_users,
-                           my_reviews=my_reviews,
+                           total_lessons=totals["lessons"],
+                           total_users=totals["users"],
+                           my_reviews=totals[my_reviews],
                            recent_users=recent_users)
 
+# CLI commands
+@app.cli.command('worker')
+@click.option('--once', is_flag=True, help='Process the current backlog and exit.')
+@click.option('--batch', default=10, show_default=True, help='Pending recordings to claim per poll.')
+def worker_command(once, batch):
+    """Process pending recordings outside the web process."""
+    # Load the speech model once, before the first recording arrives.
+    get_transcription_engine().warm_up()
+    print(f"LexiStream worker started (engine: {TRANSCRIPTION_ENGINE})")
+    while True:
+        pending_ids = [r.id for r in Recording.query.with_entities(Recording.id)
+                       .filter_by(status="pending").order_by(Recording.id).limit(batch).all()]
+        db.session.remove()
+        deferred = None
+        for recording_id in pending_ids:
+            try:
+                deferred = process_recording(recording_id)
+            except Exception as e:
+                print(f"Recording {recording_id} failed: {e}")
+            if deferred:
+                break  # an outside service is saturated; the rest would be deferred too
+        if deferred:
+            print(f"Rate limited, pausing for {deferred:.0f}s")
+            time.sleep(deferred)
+        elif not pending_ids:
+            if once:
+                break
+            sweep_abandoned_streams()
+            time.sleep(JOB_WORKER_POLL_SECONDS)
+
+def needs_retranscription():
+    """Filter for finished recordings whose transcription produced nothing usable."""
+    return db.or_(
+        Recording.transcript.is_(None),
+        Recording.transcript == "",
+        Recording.transcript.like("Transcription failed%"),
+        Recording.status == "failed",
+    )
+
+def load_checkpoint(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save_checkpoint(path, checkpoint):
+    """Write the checkpoint atomically so a kill mid-write can't corrupt it."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+def retranscribe_file(filepath, duration_seconds, lesson_id, lesson_text, with_feedback):
+    """Transcribe one file (and optionally get feedback) off the DB session; never raises."""
+    try:
+        # A backfill would rather wait its turn than be shed by the rate limiter.
+        result = transcribe_audio_detailed(filepath, bounded=False)
+    except Exception as e:
+        return None, f"Transcription error: {e}"
+    if not result.text:
+        return None, f"Transcription error: {result.error}"
+    feedback = None
+    if with_feedback:
+        speech_seconds = result.speech_ms / 1000 if result.speech_ms is not None else None
+        try:
+            feedback = generate_feedback(result.text, duration_seconds, speech_seconds,
+                                         lesson_id=lesson_id, lesson_text=lesson_text)
+        except RateLimited as e:
+            print(f"Feedback skipped: {e}")  # the existing feedback is kept
+    return (result, feedback), None
+
+@app.cli.command('retranscribe')
+@click.option('--all', 'include_all', is_flag=True,
+              help='Re-transcribe every finished recording, not only failed or empty ones.')
+@click.option('--batch', default=50, show_default=True, help='Recordings per batch (one commit each).')
+@click.option('--workers', default=4, show_default=True, help='Recordings transcribed at the same time.')
+@click.option('--with-feedback', is_flag=True, help='Also regenerate AI feedback for new transcripts.')
+@click.option('--restart', is_flag=True, help='Ignore the saved checkpoint and start from the first recording.')
+def retranscribe_command(include_all, batch, workers, with_feedback, restart):
+    """Backfill transcripts, WPM and progress for recordings whose transcription failed."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    mode = "all" if include_all else "failed"
+    checkpoint = None if restart else load_checkpoint(RETRANSCRIBE_CHECKPOINT_PATH)
+    if checkpoint and checkpoint.get("mode") != mode:
+        raise click.UsageError(
+            f"A checkpoint for a '{checkpoint.get('mode')}' run exists; finish it or pass --restart."
+        )
+    if not checkpoint:
+        checkpoint = {"mode": mode, "last_id": 0, "scanned": 0, "updated": 0}
+    elif checkpoint["last_id"]:
+        print(f"Resuming after recording #{checkpoint['last_id']}")
+
+    get_transcription_engine().warm_up()
+    query = Recording.query.filter(Recording.status.in_(("done", "failed")))
+    if not include_all:
+        query = query.filter(needs_retranscription())
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="lexistream-retranscribe") as pool:
+        while True:
+            # Keyset pagination: rows committed behind us never shift the next page.
+            rows = query.filter(Recording.id > checkpoint["last_id"])\
+                .order_by(Recording.id).limit(batch).all()
+            if not rows:
+                break
+            jobs = [(os.path.join(app.config['UPLOAD_FOLDER'], 'recordings', r.filename),
+                     r.duration_seconds or 0, r.lesson_id, r.lesson.content if r.lesson else None)
+                    for r in rows]
+            outcomes = pool.map(lambda job: retranscribe_file(*job, with_feedback), jobs)
+
+            updated = 0
+            changed_days = set()
+            for recording, (outcome, error) in zip(rows, outcomes):
+                if outcome is None:
+                    print(f"Recording {recording.id}: {error}")
+                    continue
+                result, feedback = outcome
+                wpm = calculate_wpm(result.text, recording.duration_seconds or 0)
+                recording.transcript = result.text
+                recording.transcript_segments = json.dumps(result.segments_as_dicts())
+                recording.words_per_minute = wpm
+                changed_days.add((recording.user_id, recording.created_at.date()))
+                recording.speech_seconds = result.speech_ms / 1000 if result.speech_ms is not None else None
+                recording.articulation_rate = calculate_articulation_rate(result.text, recording.speech_seconds)
+                score_recording_reading(recording)
+                recording.status = "done"
+                recording.processing_error = None
+                if feedback:
+                    recording.ai_feedback = feedback
+                progress_rows = Progress.query.filter_by(recording_id=recording.id)\
+                    .update({"words_per_minute": wpm}, synchronize_session=False)
+                if not progress_rows:
+                    db.session.add(Progress(user_id=recording.user_id, recording_id=recording.id,
+                                            words_per_minute=wpm, date=recording.created_at))
+                updated += 1
+            for user_id, day in changed_days:
+                refresh_daily_stat(user_id, day)
+            db.session.commit()
+
+            checkpoint["last_id"] = rows[-1].id
+            checkpoint["scanned"] += len(rows)
+            checkpoint["updated"] += updated
+            save_checkpoint(RETRANSCRIBE_CHECKPOINT_PATH, checkpoint)
+            db.session.expunge_all()
+            print(f"Up to recording #{checkpoint['last_id']}: "
+                  f"{checkpoint['scanned']} scanned, {checkpoint['updated']} updated")
+
+    if os.path.exists(RETRANSCRIBE_CHECKPOINT_PATH):
+        os.remove(RETRANSCRIBE_CHECKPOINT_PATH)
+    print(f"Done: {checkpoint['scanned']} scanned, {checkpoint['updated']} updated")
+
+@app.cli.command('score-readings')
+@click.option('--all', 'include_all', is_flag=True, help='Re-score recordings that already have a score.')
+@click.option('--batch', default=500, show_default=True, help='Recordings per batch (one commit each).')
+def score_readings_command(include_all, batch):
+    """Align past lesson recordings with their lesson text and store accuracy/WER."""
+    query = Recording.query.options(db.joinedload(Recording.lesson))\
+        .filter(Recording.lesson_id.isnot(None), Recording.status == "done")
+    if not include_all:
+        query = query.filter(Recording.reading_wer.is_(None))
+    last_id, scored = 0, 0
+    while True:
+        rows = query.filter(Recording.id > last_id).order_by(Recording.id).limit(batch).all()
+        if not rows:
+            break
+        for recording in rows:
+            score_recording_reading(recording)
+        db.session.commit()
+        last_id = rows[-1].id
+        scored += len(rows)
+        db.session.expunge_all()
+        print(f"Scored {scored} recording(s), up to #{last_id}")
+    print(f"Done: {scored} recording(s) scored")
+
+@app.cli.command('rebuild-daily-stats')
+def rebuild_daily_stats_command():
+    """Recompute the per-user daily rollup (DailyStat) from all recordings."""
+    day = db.func.date(Recording.created_at)
+    DailyStat.query.delete()
+    db.session.execute(db.insert(DailyStat).from_select(
+        ["user_id", "day", "seconds", "recordings", "wpm_sum", "wpm_max"],
+        db.select(
+            Recording.user_id, day,
+            db.func.coalesce(db.func.sum(Recording.duration_seconds), 0),
+            db.func.count(Recording.id),
+            db.func.coalesce(db.func.sum(Recording.words_per_minute), 0),
+            db.func.coalesce(db.func.max(Recording.words_per_minute), 0),
+        ).where(Recording.status != "recording", Recording.created_at.isnot(None))
+         .group_by(Recording.user_id, day),
+    ))
+    db.session.commit()
+    print(f"Rebuilt {DailyStat.query.count()} daily stat row(s)")
+
+@app.cli.command('rebuild-site-counters')
+def rebuild_site_counters_command():
+    """Recount the dashboard totals (SiteCounter) from the tables."""
+    counts = {
+        "users": User.query.count(),
+        "recordings": Recording.query.filter(Recording.status != "recording").count(),
+        "lessons": Lesson.query.count(),
+        "reviews": Review.query.count(),
+    }
+    for reviewer_id, count in db.session.query(Review.reviewer_id, db.func.count(Review.id))\
+            .group_by(Review.reviewer_id):
+        counts[f"reviews_by:{reviewer_id}"] = count
+    SiteCounter.query.delete()
+    db.session.add_all(SiteCounter(name=name, value=value) for name, value in counts.items())
+    db.session.commit()
+    print(f"Rebuilt {len(counts)} counter(s)")
+
+@app.cli.group('db')
+def db_cli():
+    """Database schema migrations."""
+
+@db_cli.command('upgrade')
+def db_upgrade_command():
+    """Create missing tables and apply pending schema migrations."""
+    if create_tables():
+        print("Database created at the latest schema version")
+        return
+    applied = migrations.upgrade(db.engine)
+    print(f"Applied {applied} migration(s)" if applied else "Database schema is up to date")
+
+@db_cli.command('status')
+def db_status_command():
+    """List schema migrations and whether each has been applied."""
+    done = migrations.applied_versions(db.engine)
+    for version, name, _ in migrations.MIGRATIONS:
+        print(f"{'applied' if version in done else 'pending'}  {version:>3}  {name}")
+
 if __name__ == '__main__':
     with app.app_context():
         init_database()
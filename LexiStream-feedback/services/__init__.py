@@ -0,0 +1 @@
+"""Background and processing services used by app.py."""
@@ -0,0 +1,151 @@
+"""
+Word-level alignment of a transcript against the lesson text that was read.
+
+Each lesson is tokenized once (`lesson_profile()` is cached): its word list
+plus, for every distinct word, a bitmask of the positions it occurs at.
+With those masks the word edit distance to any transcript is computed with
+Myers' bit-parallel algorithm (global variant), one big-int step per
+spoken word.
+
+`align_to_lesson()` then recovers which words matched, were substituted,
+omitted or inserted (accuracy needs the matches, not just the distance).
+Since the optimal path can never stray further than the edit distance from
+the diagonal, the traceback only fills a band of that width instead of the
+full lesson x transcript table.
+"""
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+from services.local_feedback import words
+
+MATCH = "match"
+SUBSTITUTION = "substitution"
+OMISSION = "omission"  # lesson word that wasn't read
+INSERTION = "insertion"  # spoken word that isn't in the lesson
+
+
+@dataclass(frozen=True)
+class LessonProfile:
+    tokens: tuple
+    masks: dict  # word -> bitmask of its positions in `tokens`
+
+
+@lru_cache(maxsize=1024)
+def lesson_profile(lesson_text):
+    tokens = tuple(words(lesson_text))
+    masks = {}
+    for i, token in enumerate(tokens):
+        masks[token] = masks.get(token, 0) | (1 << i)
+    return LessonProfile(tokens=tokens, masks=masks)
+
+
+def edit_distance(profile, spoken):
+    """Word-level Levenshtein distance between the lesson and `spoken` (Myers/Hyyrö)."""
+    m = len(profile.tokens)
+    if not m:
+        return len(spoken)
+    full = (1 << m) - 1
+    high = 1 << (m - 1)
+    vp, vn, score = full, 0, m
+    for word in spoken:
+        eq = profile.masks.get(word, 0)
+        xv = eq | vn
+        xh = (((eq & vp) + vp) ^ vp) | eq
+        hp = vn | (~(xh | vp) & full)
+        hn = vp & xh
+        if hp & high:
+            score += 1
+        elif hn & high:
+            score -= 1
+        # Shifting a 1 into HP makes row 0 grow by one per word: global alignment.
+        hp = ((hp << 1) | 1) & full
+        hn = (hn << 1) & full
+        vp = hn | (~(xv | hp) & full)
+        vn = hp & xv
+    return score
+
+
+@dataclass
+class ReadingScore:
+    lesson_words: int
+    spoken_words: int
+    distance: int
+    ops: list = field(default_factory=list)  # filled by align_to_lesson()
+    matches: int = None  # filled by align_to_lesson()
+
+    @property
+    def wer(self):
+        """Word error rate against the lesson (can exceed 1 with many insertions)."""
+        return self.distance / self.lesson_words if self.lesson_words else 0.0
+
+    @property
+    def accuracy(self):
+        """Share of lesson words read correctly (needs the alignment)."""
+        if self.matches is None:
+            return None
+        return self.matches / self.lesson_words if self.lesson_words else 0.0
+
+    def count(self, op):
+        return sum(1 for item in self.ops if item["op"] == op)
+
+
+def align_to_lesson(transcript, lesson_text):
+    """
+    Full alignment: ReadingScore with `ops`, one dict per step in reading order:
+    {"op": match|substitution|omission|insertion, "expected": word|None, "spoken": word|None}
+    """
+    profile = lesson_profile(lesson_text)
+    lesson = profile.tokens
+    spoken = words(transcript)
+    distance = edit_distance(profile, spoken)
+    m, n = len(lesson), len(spoken)
+    band = distance
+
+    # cost[i][j - lo(i)] for j in [i - band, i + band], clipped to the table.
+    inf = m + n + 1
+    rows = []
+    for i in range(m + 1):
+        lo, hi = max(0, i - band), min(n, i + band)
+        row = [inf] * (hi - lo + 1)
+        prev = rows[i - 1] if i else None
+        prev_lo = max(0, i - 1 - band)
+        for j in range(lo, hi + 1):
+            if i == 0:
+                best = j
+            else:
+                best = inf
+                if prev_lo <= j <= i - 1 + band:
+                    best = prev[j - prev_lo] + 1  # omission
+                if j and prev_lo <= j - 1 <= i - 1 + band:
+                    best = min(best, prev[j - 1 - prev_lo] + (lesson[i - 1] != spoken[j - 1]))
+                if j > lo:
+                    best = min(best, row[j - 1 - lo] + 1)  # insertion
+            row[j - lo] = best
+        rows.append(row)
+
+    def cost(i, j):
+        lo = max(0, i - band)
+        if lo <= j <= min(n, i + band):
+            return rows[i][j - lo]
+        return inf
+
+    # Among equally cheap paths prefer matches, then a skipped or extra word,
+    # and substitutions last, so identical words line up with each other.
+    ops = []
+    i, j = m, n
+    while i or j:
+        here = cost(i, j)
+        if i and j and lesson[i - 1] == spoken[j - 1] and cost(i - 1, j - 1) == here:
+            ops.append({"op": MATCH, "expected": lesson[i - 1], "spoken": spoken[j - 1]})
+            i, j = i - 1, j - 1
+        elif j and cost(i, j - 1) + 1 == here:
+            ops.append({"op": INSERTION, "expected": None, "spoken": spoken[j - 1]})
+            j -= 1
+        elif i and cost(i - 1, j) + 1 == here:
+            ops.append({"op": OMISSION, "expected": lesson[i - 1], "spoken": None})
+            i -= 1
+        else:
+            ops.append({"op": SUBSTITUTION, "expected": lesson[i - 1], "spoken": spoken[j - 1]})
+            i, j = i - 1, j - 1
+    ops.reverse()
+    return ReadingScore(m, n, distance, ops, matches=sum(1 for item in ops if item["op"] == MATCH))
@@ -0,0 +1,219 @@
+"""
+Audio decoding for the transcription pipeline.
+
+Uploads are decoded once into PCM and handed to the recognizer from memory.
+pydub pipes ffmpeg's output straight back over stdout, and the resulting
+buffer is wrapped in `sr.AudioData` as-is, so no temporary WAV file is
+written or re-read.
+
+Each step records how many bytes it produced in a `stats` dict (and in
+`services.metrics`), which makes it easy to confirm there is no extra copy.
+
+At ingest each upload is also re-encoded once to 16 kHz mono in a compact
+codec, so storage and later decodes only carry what the recognizer uses.
+"""
+import hashlib
+import os
+import subprocess
+
+from services import metrics
+
+
+def _record(stats, stage, nbytes):
+    stats[stage] = nbytes
+    metrics.incr(f"audio.bytes.{stage}", nbytes)
+
+
+def decode_audio(file_path, stats=None):
+    """Decode an uploaded recording into a mono pydub AudioSegment."""
+    from pydub import AudioSegment
+
+    stats = stats if stats is not None else {}
+    _record(stats, "file", os.path.getsize(file_path))
+
+    audio = AudioSegment.from_file(file_path)
+    _record(stats, "decoded_pcm", len(audio.raw_data))
+
+    # The recognizer expects mono; only pay for the downmix when needed.
+    if audio.channels != 1:
+        audio = audio.set_channels(1)
+        _record(stats, "downmix", len(audio.raw_data))
+    return audio
+
+
+def decode_audio_from(file_path, start_ms, sample_rate, stats=None):
+    """
+    Decode a recording from `start_ms` on into mono PCM at `sample_rate`.
+
+    ffmpeg seeks in the container before decoding (-ss ahead of -i), so the
+    audio before `start_ms` is only demuxed, never decoded. A streamed upload
+    that keeps growing is then decoded once overall, not again from the
+    start after every chunk.
+    """
+    from pydub import AudioSegment
+
+    stats = stats if stats is not None else {}
+    if os.path.splitext(file_path)[1].lower() == ".wav":
+        return decode_audio(file_path, stats)[start_ms:]  # read directly, no ffmpeg involved
+    _record(stats, "file", os.path.getsize(file_path))
+    result = subprocess.run(
+        [AudioSegment.converter, "-v", "error", "-ss", f"{start_ms / 1000:.3f}", "-i", file_path,
+         "-vn", "-ac", "1", "-ar", str(sample_rate), "-f", "s16le", "-acodec", "pcm_s16le", "-"],
+        capture_output=True,
+    )
+    # A file still being written ends mid-page; ffmpeg complains but returns what it decoded.
+    if result.returncode and not result.stdout:
+        raise RuntimeError(f"ffmpeg could not decode {file_path}: {result.stderr.decode(errors='replace')}")
+    data = result.stdout[:len(result.stdout) // 2 * 2]
+    _record(stats, "decoded_pcm", len(data))
+    return AudioSegment(data=data, sample_width=2, frame_rate=sample_rate, channels=1)
+
+
+def to_audio_data(audio, stats=None):
+    """Wrap a mono AudioSegment's PCM buffer for speech_recognition without copying."""
+    import speech_recognition as sr
+
+    stats = stats if stats is not None else {}
+    audio_data = sr.AudioData(audio.raw_data, audio.frame_rate, audio.sample_width)
+    _record(stats, "recognizer_payload", len(audio_data.frame_data))
+    return audio_data
+
+
+def detect_speech(audio, min_silence_ms=500, silence_offset_db=16):
+    """
+    Voice-activity detection: (start_ms, end_ms) of each stretch of speech.
+
+    Energy-based, relative to the recording's own loudness, so it works the
+    same for quiet and loud microphones. Pauses shorter than min_silence_ms
+    count as speech.
+    """
+    from pydub.silence import detect_nonsilent
+
+    if not len(audio) or audio.dBFS == float("-inf"):
+        return []
+    return [
+        (start, end)
+        for start, end in detect_nonsilent(
+            audio,
+            min_silence_len=min_silence_ms,
+            silence_thresh=audio.dBFS - silence_offset_db,
+            seek_step=10,
+        )
+    ]
+
+
+def pack_speech(speech, total_ms, max_segment_ms=30000, keep_silence_ms=200):
+    """
+    Pack speech regions into (start_ms, end_ms) spans of at most max_segment_ms.
+
+    Adjacent regions are joined until the next one would push the span over
+    the limit; a single region longer than the limit is cut hard. Silence
+    before the first and after the last region is dropped, apart from
+    keep_silence_ms of padding so word edges aren't clipped.
+    """
+    spans = []
+    span_start, span_end = None, None
+    for start, end in speech:
+        start = max(0, start - keep_silence_ms)
+        end = min(total_ms, end + keep_silence_ms)
+        if span_start is not None and end - span_start <= max_segment_ms:
+            span_end = end
+            continue
+        if span_start is not None:
+            spans.append((span_start, span_end))
+        while end - start > max_segment_ms:
+            spans.append((start, start + max_segment_ms))
+            start += max_segment_ms
+        span_start, span_end = start, end
+    if span_start is not None:
+        spans.append((span_start, span_end))
+    return spans
+
+
+# Storage codecs for normalized uploads: name -> (file extension, pydub export options)
+STORAGE_FORMATS = {
+    "opus": ("ogg", {"format": "ogg", "codec": "libopus", "parameters": ["-application", "voip"]}),
+    "flac": ("flac", {"format": "flac"}),
+}
+
+
+def normalize_for_storage(audio, sample_rate=16000):
+    """Resample to what the recognizer needs: mono, `sample_rate` Hz, 16-bit."""
+    if audio.channels != 1:
+        audio = audio.set_channels(1)
+    if audio.frame_rate != sample_rate:
+        audio = audio.set_frame_rate(sample_rate)
+    if audio.sample_width != 2:
+        audio = audio.set_sample_width(2)
+    return audio
+
+
+def export_for_storage(audio, dest_path, storage_format="opus", bitrate="24k", stats=None):
+    """
+    Encode normalized audio to `dest_path` in one of STORAGE_FORMATS.
+
+    The file is written next to its destination and renamed into place, so a
+    crash half-way never leaves a truncated recording behind.
+    """
+    _, options = STORAGE_FORMATS[storage_format]
+    options = dict(options)
+    if storage_format == "opus":
+        options["bitrate"] = bitrate
+
+    stats = stats if stats is not None else {}
+    tmp_path = dest_path + ".part"
+    try:
+        audio.export(tmp_path, **options).close()
+        os.replace(tmp_path, dest_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    _record(stats, "stored", os.path.getsize(dest_path))
+    return dest_path
+
+
+def pcm_fingerprint(audio):
+    """SHA-256 of the decoded PCM plus its format, independent of container/codec."""
+    digest = hashlib.sha256(
+        f"{audio.frame_rate}:{audio.sample_width}:{audio.channels}:".encode()
+    )
+    digest.update(audio.raw_data)
+    return digest.hexdigest()
+
+
+def completed_speech_spans(audio, from_ms, target_segment_ms=10000, max_segment_ms=30000,
+                           min_silence_ms=500, silence_offset_db=16, keep_silence_ms=200):
+    """
+    Spans after `from_ms` of a still-growing recording that can be transcribed now.
+
+    The last speech region may still be in progress, so only regions that are
+    followed by another one are final. Final regions are packed into spans of
+    at least target_segment_ms (at most max_segment_ms); a short leftover is
+    held back until more audio arrives or the recording is finished.
+    """
+    from pydub.silence import detect_nonsilent
+
+    total_ms = len(audio)
+    if total_ms - from_ms < target_segment_ms or audio.dBFS == float("-inf"):
+        return []
+
+    speech = detect_nonsilent(
+        audio[from_ms:],
+        min_silence_len=min_silence_ms,
+        silence_thresh=audio.dBFS - silence_offset_db,
+        seek_step=10,
+    )
+    speech = [(from_ms + start, from_ms + end) for start, end in speech]
+
+    spans = []
+    span_start = from_ms
+    for (start, end), (next_start, _) in zip(speech, speech[1:]):
+        # Cut halfway through the pause, but keep a little silence around speech.
+        cut = min(end + keep_silence_ms, (end + next_start) // 2)
+        while cut - span_start > max_segment_ms:
+            spans.append((span_start, span_start + max_segment_ms))
+            span_start += max_segment_ms
+        if cut - span_start >= target_segment_ms:
+            spans.append((span_start, cut))
+            span_start = cut
+    return spans
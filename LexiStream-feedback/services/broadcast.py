@@ -0,0 +1,45 @@
+"""
+In-process publish/subscribe for live page updates.
+
+Background jobs publish events about a recording (transcript ready,
+feedback text as it streams in, done) and every server-sent-events
+connection watching that recording gets them on its own queue. Only
+subscribers in the same process see the events; with the separate worker
+backend the SSE endpoint falls back to watching the database.
+"""
+import queue
+import threading
+
+
+class Broadcaster:
+    def __init__(self, max_queue=1000):
+        self.max_queue = max_queue
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel):
+        q = queue.Queue(maxsize=self.max_queue)
+        with self._lock:
+            self._channels.setdefault(channel, set()).add(q)
+        return q
+
+    def unsubscribe(self, channel, q):
+        with self._lock:
+            subscribers = self._channels.get(channel)
+            if subscribers is not None:
+                subscribers.discard(q)
+                if not subscribers:
+                    del self._channels[channel]
+
+    def has_subscribers(self, channel):
+        with self._lock:
+            return bool(self._channels.get(channel))
+
+    def publish(self, channel, event):
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        for q in subscribers:
+            try:
+                q.put_nowait(event)
+            except queue.Full:
+                pass  # a stalled client; it still gets the final text from the DB
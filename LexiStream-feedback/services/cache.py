@@ -0,0 +1,103 @@
+"""
+Persistent key/value cache with LRU and TTL eviction.
+
+Entries live in a small SQLite file (WAL mode), so they survive restarts
+and are shared by every worker process on the host without touching the
+main MySQL database. Several named caches can share one file; each keeps
+its own size cap and TTL. Values are stored as JSON.
+"""
+import json
+import time
+
+from services import metrics
+from services.sqlite_store import LocalSQLite
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_entries (
+    namespace   TEXT NOT NULL,
+    key         TEXT NOT NULL,
+    value       TEXT NOT NULL,
+    created_at  REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS ix_cache_entries_lru ON cache_entries (namespace, accessed_at);
+"""
+
+
+class PersistentCache:
+    def __init__(self, path, namespace, max_entries=10000, ttl_seconds=None):
+        self.path = path
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._db = LocalSQLite(path, _SCHEMA)
+
+    def _conn(self):
+        return self._db.connection()
+
+    def _count(self, outcome):
+        metrics.incr(f"cache.{self.namespace}.{outcome}")
+
+    def get(self, key):
+        """Return the cached value for `key`, or None on a miss or expired entry."""
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT value, created_at FROM cache_entries WHERE namespace = ? AND key = ?",
+            (self.namespace, key),
+        ).fetchone()
+        now = time.time()
+        if row is None:
+            self._count("misses")
+            return None
+        if self.ttl_seconds and now - row[1] > self.ttl_seconds:
+            conn.execute(
+                "DELETE FROM cache_entries WHERE namespace = ? AND key = ?",
+                (self.namespace, key),
+            )
+            self._count("misses")
+            return None
+        conn.execute(
+            "UPDATE cache_entries SET accessed_at = ? WHERE namespace = ? AND key = ?",
+            (now, self.namespace, key),
+        )
+        self._count("hits")
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache_entries (namespace, key, value, created_at, accessed_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (self.namespace, key, json.dumps(value), now, now),
+        )
+        self._evict(conn)
+
+    def _evict(self, conn):
+        overflow = self.size() - self.max_entries
+        if overflow > 0:
+            conn.execute(
+                "DELETE FROM cache_entries WHERE namespace = ? AND key IN ("
+                "  SELECT key FROM cache_entries WHERE namespace = ?"
+                "  ORDER BY accessed_at ASC LIMIT ?)",
+                (self.namespace, self.namespace, overflow),
+            )
+            metrics.incr(f"cache.{self.namespace}.evictions", overflow)
+
+    def size(self):
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM cache_entries WHERE namespace = ?", (self.namespace,)
+        ).fetchone()[0]
+
+    def stats(self):
+        counters = metrics.snapshot()["counters"]
+        hits = counters.get(f"cache.{self.namespace}.hits", 0)
+        misses = counters.get(f"cache.{self.namespace}.misses", 0)
+        lookups = hits + misses
+        return {
+            "size": self.size(),
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else None,
+        }
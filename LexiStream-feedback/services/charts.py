@@ -0,0 +1,48 @@
+"""
+Downsampling for line charts.
+
+`lttb()` is Largest-Triangle-Three-Buckets (Steinarsson, 2013). It keeps
+the first and last points and splits the rest into equal slices. From
+each slice it keeps the point that forms the largest triangle with the
+point kept before it and the average of the next slice. Unlike averaging
+or taking every n-th point, this keeps the peaks and dips, which are what
+a student looks for in their progress chart.
+"""
+
+
+def lttb(points, threshold):
+    """
+    Indices of the at most `threshold` points to keep, in order.
+
+    `points` is a sequence of (x, y) pairs sorted by x. A `threshold`
+    below 3 is treated as 3: the first point, the last, and one between.
+    """
+    n = len(points)
+    threshold = max(3, threshold)
+    if n <= threshold:
+        return list(range(n))
+    kept = [0]
+    size = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * size) + 1
+        end = int((i + 1) * size) + 1
+        # Average of the next slice (just the last point for the final slice)
+        next_end = min(int((i + 2) * size) + 1, n)
+        if end >= n - 1 or next_end <= end:
+            avg_x, avg_y = points[-1]
+        else:
+            span = points[end:next_end]
+            avg_x = sum(p[0] for p in span) / len(span)
+            avg_y = sum(p[1] for p in span) / len(span)
+        ax, ay = points[a]
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            x, y = points[j]
+            area = abs((ax - avg_x) * (y - ay) - (ax - x) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        kept.append(best)
+        a = best
+    kept.append(n - 1)
+    return kept
@@ -0,0 +1,138 @@
+"""
+Speech-to-text engines.
+
+Every engine takes a mono pydub AudioSegment and returns the recognized text:
+"" when the audio was understood to contain no words, an exception for a
+real failure (network, quota, missing model). The engine is chosen with
+TRANSCRIPTION_ENGINE in api_keys/config.py:
+
+    "google" : Google Web Speech via SpeechRecognition (free, needs internet)
+    "vosk"   : fully local CPU recognition with a Vosk model
+    "stub"   : deterministic fake for tests and offline development
+
+Engines are created once per process by `get_engine()`, so the Vosk model
+is loaded once per worker rather than once per recording.
+"""
+import json
+import os
+import threading
+
+
+class TranscriptionError(Exception):
+    """Raised by an engine when a segment could not be transcribed."""
+
+
+class TranscriptionEngine:
+    name = "base"
+    # Preferred input sample rate; audio is resampled once before splitting.
+    sample_rate = None
+
+    def warm_up(self):
+        """Load anything expensive up front (models, connections)."""
+
+    def transcribe(self, audio):
+        raise NotImplementedError
+
+
+class GoogleEngine(TranscriptionEngine):
+    name = "google"
+
+    def transcribe(self, audio):
+        import speech_recognition as sr
+        from services.audio import to_audio_data
+
+        r = sr.Recognizer()
+        try:
+            # Using Google Web Speech API (free, no key needed)
+            return r.recognize_google(to_audio_data(audio))
+        except sr.UnknownValueError:
+            return ""
+        except sr.RequestError as e:
+            raise TranscriptionError(f"Error with speech recognition service: {e}")
+
+
+class VoskEngine(TranscriptionEngine):
+    name = "vosk"
+    sample_rate = 16000
+
+    def __init__(self, model_path=None):
+        self.model_path = model_path
+        self._model = None
+        self._lock = threading.Lock()
+
+    def warm_up(self):
+        self._get_model()
+
+    def _get_model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    try:
+                        import vosk
+                    except ImportError:
+                        raise TranscriptionError(
+                            "The vosk package is not installed (pip install vosk)."
+                        )
+                    if not self.model_path or not os.path.isdir(self.model_path):
+                        raise TranscriptionError(
+                            f"Vosk model not found at {self.model_path!r}. "
+                            "Download one from https://alphacephei.com/vosk/models"
+                        )
+                    vosk.SetLogLevel(-1)
+                    self._model = vosk.Model(self.model_path)
+        return self._model
+
+    def transcribe(self, audio):
+        model = self._get_model()
+        import vosk
+
+        audio = audio.set_channels(1).set_frame_rate(self.sample_rate).set_sample_width(2)
+        # Recognizers are cheap and not thread-safe; the model is shared.
+        recognizer = vosk.KaldiRecognizer(model, self.sample_rate)
+        recognizer.AcceptWaveform(audio.raw_data)
+        return json.loads(recognizer.FinalResult()).get("text", "")
+
+
+class StubEngine(TranscriptionEngine):
+    """Returns fixed text, or one "word" per half second of audio (~120 WPM)."""
+    name = "stub"
+
+    def __init__(self, text=None):
+        self.text = text
+
+    def transcribe(self, audio):
+        if self.text is not None:
+            return self.text
+        words = int(round(len(audio) / 500))
+        return " ".join(["word"] * words)
+
+
+ENGINES = {
+    GoogleEngine.name: GoogleEngine,
+    VoskEngine.name: VoskEngine,
+    StubEngine.name: StubEngine,
+}
+
+_instances = {}
+_instances_pid = None
+_instances_lock = threading.Lock()
+
+
+def get_engine(name, **options):
+    """Return this process's engine instance for `name`, creating it on first use."""
+    global _instances_pid
+    with _instances_lock:
+        # Forked workers must not share a parent's half-initialised engines.
+        if _instances_pid != os.getpid():
+            _instances.clear()
+            _instances_pid = os.getpid()
+        engine = _instances.get(name)
+        if engine is None:
+            try:
+                engine_cls = ENGINES[name]
+            except KeyError:
+                raise ValueError(
+                    f"Unknown TRANSCRIPTION_ENGINE {name!r}; choose one of {sorted(ENGINES)}"
+                )
+            engine = _instances[name] = engine_cls(**options)
+        return engine
@@ -0,0 +1,440 @@
+"""
+AI feedback on transcripts via Cohere.
+
+`FeedbackService` keeps one Cohere client (and so one pooled HTTP
+connection) per process instead of building a new client for every
+recording. Requests have connect/read timeouts, and a circuit breaker stops
+calling the API for a while after repeated failures: during an outage each
+recording gets the fallback text immediately instead of waiting for a
+timeout.
+
+With a cache, feedback is stored under a fingerprint of the transcript
+(case and punctuation folded) plus the lesson being read, so students
+reading the same lesson text share one API call.
+
+With a batch window, feedback requests that arrive close together (a class
+finishing a reading at once) are packed into a single JSON-mode chat call
+by `FeedbackBatcher` and split back per recording; a reply that can't be
+parsed falls back to one call per transcript.
+
+`feedback_stream()` is the same request made with Cohere's streaming API,
+handing each piece of text to a callback as it arrives; it is used when
+someone is watching the result page. Streaming only happens on a cache
+miss when no batch could form: if other recordings could share the call,
+the batch wins and the watcher gets the whole text at once. One call for
+several students saves more than a faster first word for one of them.
+
+With a `limiter` (see `services.ratelimit`) every Cohere call first waits
+for a token from the bucket shared by all worker processes; a call shed
+by a full queue raises `RateLimited` to the caller, which decides whether
+to defer the recording or use fallback feedback.
+
+Latency and outcomes are recorded in `services.metrics`:
+    feedback.api_seconds      histogram of Cohere round trips
+    feedback.api_errors       failed calls (timeouts, HTTP errors)
+    feedback.short_circuited  calls skipped because the breaker was open
+    feedback.batch_size       histogram of transcripts per batched call
+    feedback.first_token_seconds  time to the first streamed piece of text
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future
+
+from services import metrics
+
+SYSTEM_PROMPT = (
+    "You are a friendly language coach. ALWAYS provide feedback, "
+    "even if the transcript is short, repeated, or unclear. "
+    "Give 2-3 short, constructive sentences focusing on clarity, pace, "
+    "pronunciation, and effort."
+)
+
+NOTED_FEEDBACK = "Your recording is noted! Try to maintain clarity and consistent pace."
+
+FALLBACK_FEEDBACK = (
+    "Good attempt! Focus on clear pronunciation and maintain a steady pace. "
+    "Keep practicing to improve fluency."
+)
+
+BATCH_INSTRUCTIONS = (
+    " You will be given several numbered transcripts, each read by a different student. "
+    "Reply with JSON only, in the form "
+    '{"feedback": [{"id": <transcript number>, "feedback": "<your feedback>"}]}, '
+    "with exactly one entry per transcript."
+)
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32)
+
+
+_PUNCTUATION = re.compile(r"[^\w\s]+")
+
+
+def transcript_fingerprint(transcript):
+    """SHA-256 of the transcript with case, punctuation and spacing folded away."""
+    folded = _PUNCTUATION.sub(" ", transcript.casefold())
+    return hashlib.sha256(" ".join(folded.split()).encode("utf-8")).hexdigest()
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after `failure_threshold` consecutive failures.
+
+    While open, `allow()` is False until `reset_seconds` have passed; then a
+    single trial call is let through (half-open). Its success closes the
+    breaker, its failure opens it again for another `reset_seconds`.
+    """
+
+    def __init__(self, failure_threshold=5, reset_seconds=60):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self._opened_at is not None
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial_running or time.monotonic() - self._opened_at < self.reset_seconds:
+                return False
+            self._trial_running = True
+            return True
+
+    def release(self):
+        """The call `allow()` let through was not made after all (e.g. it was rate limited)."""
+        with self._lock:
+            self._trial_running = False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial_running = False
+
+
+class FeedbackBatcher:
+    """
+    Collects concurrent requests for `window_seconds` and sends them together.
+
+    The first caller into an empty batch becomes its leader: it waits for the
+    window to pass (or the batch to fill up), takes everything queued and
+    runs it, while the other callers block on their own result. Callers that
+    arrive after that start the next batch.
+
+    Only threads of this process can share a batch. `peers()`, if given,
+    says how many other callers could still submit right now; the leader
+    stops waiting once that many have joined, so a lone caller (one worker
+    thread, or nothing else in flight) is sent at once instead of sitting
+    out the window for nothing.
+    """
+
+    def __init__(self, generate_batch, generate_one, window_seconds=0.5, max_batch=8, peers=None):
+        self.generate_batch = generate_batch
+        self.generate_one = generate_one
+        self.window_seconds = window_seconds
+        self.max_batch = max_batch
+        self.peers = peers
+        self._pending = []
+        self._cond = threading.Condition()
+
+    def has_peers(self):
+        """Whether another caller could join a batch right now (assumed so without `peers`)."""
+        return self.peers is None or self.peers() > 0
+
+    def _full(self):
+        if self.peers is None:
+            return len(self._pending) >= self.max_batch
+        return len(self._pending) >= min(self.max_batch, 1 + self.peers())
+
+    def submit(self, transcript):
+        future = Future()
+        with self._cond:
+            self._pending.append((transcript, future))
+            leader = len(self._pending) == 1
+            if not leader:
+                self._cond.notify_all()
+        if leader:
+            with self._cond:
+                self._cond.wait_for(self._full, timeout=self.window_seconds)
+                batch, self._pending = self._pending, []
+            for start in range(0, len(batch), self.max_batch):
+                self._run(batch[start:start + self.max_batch])
+        return future.result()
+
+    def _run(self, batch):
+        transcripts = [transcript for transcript, _ in batch]
+        metrics.observe("feedback.batch_size", len(batch), buckets=BATCH_SIZE_BUCKETS)
+        try:
+            results = self.generate_batch(transcripts) if len(batch) > 1 else [None]
+            for (transcript, future), text in zip(batch, results):
+                future.set_result(text if text else self.generate_one(transcript))
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+
+def _parse_batch_reply(text, count):
+    """Feedback per transcript from a batched JSON reply; None entries for anything missing."""
+    results = [None] * count
+    if not text:
+        return results
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.strip("`").split("\n", 1)[-1]
+    try:
+        items = json.loads(text)["feedback"]
+        for item in items:
+            index = int(item["id"]) - 1
+            if 0 <= index < count and isinstance(item.get("feedback"), str) and item["feedback"].strip():
+                results[index] = item["feedback"].strip()
+    except (ValueError, KeyError, TypeError):
+        metrics.incr("feedback.batch_parse_failures")
+    return results
+
+
+def _response_text(response):
+    msg = getattr(response, "message", None)
+    if not msg:
+        return None
+    content = getattr(msg, "content", None)
+    if isinstance(content, list):
+        texts = [p.text for p in content if getattr(p, "text", None)]
+        return " ".join(texts).strip() if texts else None
+    if hasattr(content, "text"):
+        return content.text.strip()
+    return str(content).strip()
+
+
+class FeedbackService:
+    def __init__(self, api_key, model="command-r-plus-08-2024", max_tokens=200,
+                 connect_timeout=5.0, read_timeout=30.0, max_connections=10,
+                 failure_threshold=5, reset_seconds=60, cache=None,
+                 batch_window_seconds=0, max_batch=8, batch_peers=None, limiter=None):
+        self.api_key = api_key
+        self.cache = cache
+        self.limiter = limiter
+        self.model = model
+        self.max_tokens = max_tokens
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_connections = max_connections
+        self.breaker = CircuitBreaker(failure_threshold, reset_seconds)
+        self._client = None
+        self._client_pid = None
+        self._lock = threading.Lock()
+        self.batcher = None
+        if batch_window_seconds > 0 and max_batch > 1:
+            self.batcher = FeedbackBatcher(self.feedback_batch, self.feedback_one,
+                                           batch_window_seconds, max_batch, batch_peers)
+
+    def _get_client(self):
+        """The process's Cohere client; rebuilt after a fork so sockets aren't shared."""
+        if self._client is None or self._client_pid != os.getpid():
+            with self._lock:
+                if self._client is None or self._client_pid != os.getpid():
+                    import cohere
+                    import httpx
+
+                    http = httpx.Client(
+                        timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+                        limits=httpx.Limits(max_connections=self.max_connections,
+                                            max_keepalive_connections=self.max_connections),
+                    )
+                    # Retries would multiply the worst-case wait; the breaker handles outages.
+                    self._client = cohere.ClientV2(api_key=self.api_key, httpx_client=http,
+                                                   timeout=self.read_timeout, max_retries=0)
+                    self._client_pid = os.getpid()
+        return self._client
+
+    def _wait_for_slot(self):
+        if self.limiter is None:
+            return
+        try:
+            self.limiter.acquire()
+        except Exception:
+            self.breaker.release()
+            raise
+
+    def chat(self, messages, max_tokens=None, **options):
+        """
+        One Cohere chat call through the pooled client and the breaker.
+
+        Returns the response text, or None when the breaker is open, the call
+        failed or the reply was empty. Raises RateLimited when shed by the limiter.
+        """
+        if not self.api_key:
+            return None
+        if not self.breaker.allow():
+            metrics.incr("feedback.short_circuited")
+            return None
+        self._wait_for_slot()
+
+        started = time.perf_counter()
+        try:
+            response = self._get_client().chat(
+                model=self.model,
+                messages=messages,
+                max_tokens=max_tokens or self.max_tokens,
+                **options,
+            )
+        except Exception as e:
+            self.breaker.record_failure()
+            metrics.incr("feedback.api_errors")
+            print("Cohere feedback error:", e)
+            response = None
+        else:
+            self.breaker.record_success()
+        metrics.observe("feedback.api_seconds", time.perf_counter() - started)
+        metrics.set_gauge("feedback.breaker_open", int(self.breaker.is_open))
+        return _response_text(response) if response is not None else None
+
+    def chat_stream(self, messages, on_delta, max_tokens=None):
+        """
+        Streaming variant of `chat()`: `on_delta(text)` gets each piece as it arrives.
+
+        Returns the full text, or None (possibly after some deltas were
+        already delivered) when the breaker is open or the stream failed.
+        """
+        if not self.api_key:
+            return None
+        if not self.breaker.allow():
+            metrics.incr("feedback.short_circuited")
+            return None
+        self._wait_for_slot()
+
+        started = time.perf_counter()
+        pieces = []
+        try:
+            for event in self._get_client().chat_stream(
+                model=self.model,
+                messages=messages,
+                max_tokens=max_tokens or self.max_tokens,
+            ):
+                if getattr(event, "type", None) != "content-delta":
+                    continue
+                text = event.delta.message.content.text
+                if text:
+                    if not pieces:
+                        metrics.observe("feedback.first_token_seconds", time.perf_counter() - started)
+                    pieces.append(text)
+                    on_delta(text)
+        except Exception as e:
+            self.breaker.record_failure()
+            metrics.incr("feedback.api_errors")
+            print("Cohere feedback error:", e)
+            pieces = None
+        else:
+            self.breaker.record_success()
+        metrics.observe("feedback.api_seconds", time.perf_counter() - started)
+        metrics.set_gauge("feedback.breaker_open", int(self.breaker.is_open))
+        return "".join(pieces).strip() if pieces else None
+
+    def cache_key(self, transcript, lesson_id=None):
+        # The prompt is part of the key so editing it doesn't serve stale advice.
+        prompt = hashlib.sha256(SYSTEM_PROMPT.encode("utf-8")).hexdigest()[:8]
+        return f"{self.model}:{prompt}:{lesson_id or '-'}:{transcript_fingerprint(transcript)}"
+
+    def feedback(self, transcript, lesson_id=None):
+        """2-3 sentences of coaching on `transcript`; always returns some text."""
+        if not transcript or not transcript.strip() or not self.api_key:
+            return NOTED_FEEDBACK
+
+        key = self.cache_key(transcript, lesson_id) if self.cache is not None else None
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        if self.batcher is not None:
+            text = self.batcher.submit(transcript)
+        else:
+            text = self.feedback_one(transcript)
+        if not text:
+            return FALLBACK_FEEDBACK
+        if key is not None:
+            self.cache.set(key, text)
+        return text
+
+    def feedback_stream(self, transcript, on_delta, lesson_id=None):
+        """
+        Like `feedback()`, but streamed: `on_delta(text)` receives the text as it arrives.
+
+        Cached and fallback feedback is delivered as a single piece, and so
+        is batched feedback when other recordings could share the call (see
+        the module docstring). Returns the complete text, which is what
+        should be stored and shown: if the stream fails part-way, the pieces
+        already delivered are not followed by anything, and the fallback
+        text returned replaces them.
+        """
+        if not transcript or not transcript.strip() or not self.api_key:
+            on_delta(NOTED_FEEDBACK)
+            return NOTED_FEEDBACK
+
+        key = self.cache_key(transcript, lesson_id) if self.cache is not None else None
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                on_delta(cached)
+                return cached
+
+        if self.batcher is not None and self.batcher.has_peers():
+            text = self.feedback(transcript, lesson_id=lesson_id)
+            on_delta(text)
+            return text
+
+        text = self.chat_stream(self._messages(transcript), on_delta)
+        if not text:
+            return FALLBACK_FEEDBACK
+        if key is not None:
+            self.cache.set(key, text)
+        return text
+
+    def _messages(self, transcript):
+        transcript_for_ai = (
+            "This is a language learning exercise. "
+            "The user read the following transcript aloud (some words may be repeated intentionally for practice):\n\n"
+            f"{transcript}"
+        )
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": transcript_for_ai},
+        ]
+
+    def feedback_one(self, transcript):
+        """Feedback for a single transcript in its own chat call (None on failure)."""
+        return self.chat(self._messages(transcript))
+
+    def feedback_batch(self, transcripts):
+        """Feedback for several transcripts in one JSON-mode call; None for any not answered."""
+        numbered = "\n\n".join(f"[{i}]\n{t}" for i, t in enumerate(transcripts, start=1))
+        transcripts_for_ai = (
+            "This is a language learning exercise. "
+            "Each student read the transcript below aloud (some words may be repeated intentionally for practice):\n\n"
+            f"{numbered}"
+        )
+        text = self.chat(
+            [
+                {"role": "system", "content": SYSTEM_PROMPT + BATCH_INSTRUCTIONS},
+                {"role": "user", "content": transcripts_for_ai},
+            ],
+            max_tokens=self.max_tokens * len(transcripts),
+            response_format={"type": "json_object"},
+        )
+        return _parse_batch_reply(text, len(transcripts))
@@ -0,0 +1,62 @@
+"""
+Small in-process job queue for slow per-recording work.
+
+The durable job state lives on the `Recording` row (`status` column), so the
+queue itself only has to run callables on a bounded thread pool and make sure
+the same recording is never processed twice at the same time. A separate
+worker process (`flask --app app worker`) can pick up the same pending rows
+when the local pool is disabled.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobQueue:
+    """Bounded thread pool that de-duplicates jobs by key."""
+
+    def __init__(self, max_workers=2, name="lexistream-job"):
+        self.max_workers = max(1, int(max_workers))
+        self.name = name
+        self._executor = None
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+    def _get_executor(self):
+        # Created lazily so importing app.py (e.g. for CLI commands) does not
+        # spin up threads that are never used.
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix=self.name
+            )
+        return self._executor
+
+    def submit(self, key, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) in the background unless `key` is already queued."""
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None and not future.done():
+                return future
+            future = self._get_executor().submit(self._run, key, fn, *args, **kwargs)
+            self._inflight[key] = future
+            return future
+
+    def _run(self, key, fn, *args, **kwargs):
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            print(f"Background job {key} failed: {e}")
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def depth(self):
+        """Number of jobs queued or running."""
+        with self._lock:
+            return len(self._inflight)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
@@ -0,0 +1,134 @@
+"""
+Rule-based feedback computed locally from simple reading signals.
+
+Many recordings don't need a language model: a couple of words, or a clean
+reading of the lesson at a comfortable pace, all get much the same advice.
+`compute_signals()` measures pace, pauses, repeated words and how much of
+the lesson text was read; `needs_llm()` decides whether the recording is
+interesting enough for Cohere, and `local_feedback()` writes 2-3 sentences
+from the signals otherwise.
+
+Everything here is plain Python on short strings: no I/O, no network, and
+it runs in microseconds, so it can be exercised directly in a shell or test.
+"""
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+
+_WORD = re.compile(r"[\w']+")
+
+# Reading-aloud pace bands, in words per minute
+SLOW_WPM = 90
+FAST_WPM = 170
+
+SHORT_TRANSCRIPT_WORDS = 5
+HIGH_PAUSE_RATIO = 0.4
+FULL_COVERAGE = 0.95
+PARTIAL_COVERAGE = 0.7
+
+
+def words(text):
+    """Lower-cased words with punctuation removed (apostrophes kept)."""
+    return _WORD.findall(text.casefold()) if text else []
+
+
+@dataclass
+class FeedbackSignals:
+    word_count: int
+    words_per_minute: float
+    pause_ratio: float = None  # share of the recording that was silence
+    lesson_coverage: float = None  # share of the lesson's words that were read
+    repeated_words: list = field(default_factory=list)
+
+    @property
+    def pace(self):
+        if self.words_per_minute < SLOW_WPM:
+            return "slow"
+        if self.words_per_minute > FAST_WPM:
+            return "fast"
+        return "steady"
+
+
+def compute_signals(transcript, duration_seconds, speech_seconds=None, lesson_text=None):
+    spoken = words(transcript)
+    wpm = len(spoken) / duration_seconds * 60 if duration_seconds else 0.0
+
+    pause_ratio = None
+    if duration_seconds and speech_seconds is not None:
+        pause_ratio = max(0.0, 1 - speech_seconds / duration_seconds)
+
+    coverage = None
+    lesson_words = words(lesson_text)
+    if lesson_words:
+        read = Counter(spoken)
+        matched = sum(min(n, read[w]) for w, n in Counter(lesson_words).items())
+        coverage = matched / len(lesson_words)
+
+    # A word said twice in a row is usually a restart ("the the cat").
+    repeated = []
+    for previous, word in zip(spoken, spoken[1:]):
+        if word == previous and word not in repeated:
+            repeated.append(word)
+
+    return FeedbackSignals(
+        word_count=len(spoken),
+        words_per_minute=round(wpm, 1),
+        pause_ratio=pause_ratio,
+        lesson_coverage=coverage,
+        repeated_words=repeated,
+    )
+
+
+def needs_llm(signals):
+    """
+    Route: True when the recording deserves a model's nuance.
+
+    Very short transcripts and clean, complete lesson readings at a steady
+    pace get local feedback; everything else (free speech, partial or
+    stumbling readings) goes to the LLM.
+    """
+    if signals.word_count < SHORT_TRANSCRIPT_WORDS:
+        return False
+    return not (
+        signals.lesson_coverage is not None
+        and signals.lesson_coverage >= FULL_COVERAGE
+        and signals.pace == "steady"
+        and not signals.repeated_words
+        and (signals.pause_ratio is None or signals.pause_ratio <= HIGH_PAUSE_RATIO)
+    )
+
+
+def local_feedback(signals):
+    """2-3 sentences of feedback built from the signals."""
+    wpm = int(round(signals.words_per_minute))
+    if signals.word_count < SHORT_TRANSCRIPT_WORDS:
+        return (
+            "Good start! This recording was very short, so try reading a full sentence or two "
+            "next time and we can give you more detailed feedback."
+        )
+
+    sentences = []
+    if signals.lesson_coverage is not None:
+        if signals.lesson_coverage >= FULL_COVERAGE:
+            sentences.append("Well done, you read the whole passage clearly.")
+        elif signals.lesson_coverage >= PARTIAL_COVERAGE:
+            sentences.append("You read most of the passage; a few words were missed or hard to make out.")
+        else:
+            sentences.append("Parts of the passage were missing, so read it through once more before recording.")
+
+    if signals.pace == "slow":
+        sentences.append(f"Your pace was about {wpm} words per minute; try reading in longer phrases to sound more fluent.")
+    elif signals.pace == "fast":
+        sentences.append(f"At about {wpm} words per minute you read quite quickly; slow down a little so every word is clear.")
+    else:
+        sentences.append(f"Your pace of about {wpm} words per minute is comfortable to follow.")
+
+    if signals.repeated_words:
+        sentences.append(
+            f"You repeated \"{signals.repeated_words[0]}\"; if you stumble, keep going rather than restarting the word."
+        )
+    elif signals.pause_ratio is not None and signals.pause_ratio > HIGH_PAUSE_RATIO:
+        sentences.append("There were some long pauses, so aim for a steady flow from one sentence to the next.")
+    else:
+        sentences.append("Keep practicing to build even more confidence.")
+    return " ".join(sentences[:3])
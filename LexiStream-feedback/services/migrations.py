@@ -0,0 +1,220 @@
+"""
+Versioned schema migrations.
+
+`db.create_all()` only creates missing tables; it never changes existing
+ones. Every later schema change is a numbered migration here, and the
+numbers already applied are recorded in the `schema_migrations` table, so
+each step runs exactly once per database:
+
+    flask --app app db upgrade    apply pending migrations
+    flask --app app db status     show applied and pending migrations
+
+A brand-new database is built by `create_all()` from the current models
+and is stamped as fully migrated without running anything. Migrations
+talk to the database through plain SQL on a connection (SQLite and MySQL)
+and may inspect the schema, since they only ever run once; nothing here
+is called on a normal startup.
+
+To add one, append a function decorated with `@migration(<next number>,
+"<what it does>")` and make the matching change on the model.
+"""
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+
+from services import search
+
+MIGRATIONS = []
+
+_VERSION_TABLE = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version     INTEGER PRIMARY KEY,
+    name        VARCHAR(200) NOT NULL,
+    applied_at  DATETIME NOT NULL
+)
+"""
+
+
+def migration(version, name):
+    def register(fn):
+        if MIGRATIONS and version <= MIGRATIONS[-1][0]:
+            raise ValueError(f"Migration {version} is out of order")
+        MIGRATIONS.append((version, name, fn))
+        return fn
+    return register
+
+
+def applied_versions(engine):
+    """Versions recorded as applied; none if `schema_migrations` doesn't exist yet. Read-only."""
+    with engine.connect() as conn:
+        if not inspect(conn).has_table("schema_migrations"):
+            return set()
+        return {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+
+def pending(engine):
+    """(version, name) of every migration not yet applied, in order (changes nothing)."""
+    done = applied_versions(engine)
+    return [(version, name) for version, name, _ in MIGRATIONS if version not in done]
+
+
+def _record(conn, version, name):
+    conn.execute(
+        text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:v, :n, :t)"),
+        {"v": version, "n": name, "t": datetime.utcnow()},
+    )
+
+
+def upgrade(engine, log=print):
+    """Apply pending migrations in order, each in its own transaction. Returns how many ran."""
+    with engine.begin() as conn:
+        conn.execute(text(_VERSION_TABLE))
+    done = applied_versions(engine)
+    count = 0
+    for version, name, fn in MIGRATIONS:
+        if version in done:
+            continue
+        log(f"Applying migration {version}: {name}")
+        with engine.begin() as conn:
+            fn(conn)
+            _record(conn, version, name)
+        count += 1
+    return count
+
+
+def stamp(engine):
+    """Mark every migration as applied (for a database just built from the current models)."""
+    done = applied_versions(engine)
+    with engine.begin() as conn:
+        conn.execute(text(_VERSION_TABLE))
+        for version, name, _ in MIGRATIONS:
+            if version not in done:
+                _record(conn, version, name)
+
+
+def _columns(conn, table):
+    return {c["name"] for c in inspect(conn).get_columns(table)}
+
+
+def _add_columns(conn, table, columns):
+    """ALTER TABLE ... ADD COLUMN for each (name, type) the table doesn't have yet."""
+    if not inspect(conn).has_table(table):
+        return
+    existing = _columns(conn, table)
+    for name, definition in columns:
+        if name not in existing:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {definition}"))
+
+
+def _create_index(conn, name, table, columns, unique=False):
+    """CREATE INDEX unless an index (or unique constraint) by that name already exists."""
+    inspector = inspect(conn)
+    existing = {ix["name"] for ix in inspector.get_indexes(table)}
+    existing |= {uc["name"] for uc in inspector.get_unique_constraints(table)}
+    if name not in existing:
+        kind = "UNIQUE INDEX" if unique else "INDEX"
+        conn.execute(text(f"CREATE {kind} {name} ON {table} ({', '.join(columns)})"))
+
+
+@migration(1, "columns added before versioned migrations")
+def _legacy_columns(conn):
+    # What ensure_schema_upgrades() used to check on every startup; only
+    # databases created before those columns existed need any of it.
+    _add_columns(conn, "user", [
+        ("is_admin", "INTEGER NOT NULL DEFAULT 0"),
+        ("display_name", "VARCHAR(120)"),
+        ("bio", "TEXT"),
+        ("location", "VARCHAR(120)"),
+        ("website", "VARCHAR(255)"),
+        ("avatar_url", "VARCHAR(255)"),
+        ("role", "VARCHAR(20) NOT NULL DEFAULT 'user'"),
+    ])
+    _add_columns(conn, "recording", [
+        ("ai_feedback", "TEXT"),
+        ("status", "VARCHAR(20) NOT NULL DEFAULT 'done'"),
+        ("processing_error", "TEXT"),
+        ("original_filename", "VARCHAR(255)"),
+        ("lesson_id", "INTEGER"),
+        ("reading_accuracy", "FLOAT"),
+        ("reading_wer", "FLOAT"),
+        ("speech_seconds", "FLOAT"),
+        ("articulation_rate", "FLOAT"),
+        ("transcript_segments", "TEXT"),
+    ])
+
+
+@migration(2, "indexes for the admin user and recording lists")
+def _admin_list_indexes(conn):
+    _create_index(conn, "ix_user_created_at_id", "user", ["created_at", "id"])
+    _create_index(conn, "ix_user_role_created_at_id", "user", ["role", "created_at", "id"])
+    _create_index(conn, "ix_recording_created_at_id", "recording", ["created_at", "id"])
+    _create_index(conn, "ix_recording_user_created_at_id", "recording", ["user_id", "created_at", "id"])
+    _create_index(conn, "ix_recording_words_per_minute", "recording", ["words_per_minute"])
+
+
+@migration(3, "hot-path indexes and one goal per user")
+def _hot_path_indexes(conn):
+    _create_index(conn, "ix_progress_user_id_date", "progress", ["user_id", "date"])
+    _create_index(conn, "ix_review_recording_id", "review", ["recording_id"])
+    _create_index(conn, "ix_review_reviewer_id", "review", ["reviewer_id"])
+    _create_index(conn, "ix_vocabulary_user_id_created_at", "vocabulary", ["user_id", "created_at"])
+    # Concurrent first visits could create a second goal; the app always
+    # read the first one, so that is the one kept. (The derived table lets
+    # MySQL delete from the table it selects from.)
+    conn.execute(text(
+        "DELETE FROM goal WHERE id NOT IN ("
+        "  SELECT keep_id FROM (SELECT MIN(id) AS keep_id FROM goal GROUP BY user_id) AS keep)"
+    ))
+    _create_index(conn, "uq_goal_user_id", "goal", ["user_id"], unique=True)
+
+
+@migration(4, "daily_stat rollup filled from existing recordings")
+def _daily_stat_backfill(conn):
+    # The table itself comes from the DailyStat model (`db upgrade` creates
+    # missing tables first); this only fills it for recordings made so far.
+    conn.execute(text("DELETE FROM daily_stat"))
+    conn.execute(text(
+        "INSERT INTO daily_stat (user_id, day, seconds, recordings, wpm_sum, wpm_max) "
+        "SELECT user_id, DATE(created_at), COALESCE(SUM(duration_seconds), 0), COUNT(id), "
+        "       COALESCE(SUM(words_per_minute), 0), COALESCE(MAX(words_per_minute), 0) "
+        "FROM recording WHERE status != 'recording' AND created_at IS NOT NULL "
+        "GROUP BY user_id, DATE(created_at)"
+    ))
+
+
+@migration(5, "site_counter totals counted from existing rows")
+def _site_counter_backfill(conn):
+    # Like migration 4, the table comes from the SiteCounter model.
+    reviewer = ("CONCAT('reviews_by:', reviewer_id)" if conn.dialect.name == "mysql"
+                else "'reviews_by:' || reviewer_id")
+    conn.execute(text("DELETE FROM site_counter"))
+    conn.execute(text(
+        "INSERT INTO site_counter (name, value) "
+        "SELECT 'users', COUNT(*) FROM user "
+        "UNION ALL SELECT 'recordings', COUNT(*) FROM recording WHERE status != 'recording' "
+        "UNION ALL SELECT 'lessons', COUNT(*) FROM lesson "
+        "UNION ALL SELECT 'reviews', COUNT(*) FROM review "
+        f"UNION ALL SELECT {reviewer}, COUNT(*) FROM review GROUP BY reviewer_id"
+    ))
+
+
+@migration(6, "full-text search index on recording transcripts and feedback")
+def _recording_search_index(conn):
+    search.install(conn)
+    search.rebuild(conn)  # index the recordings made so far
+
+
+@migration(7, "created_at filled in and NOT NULL on user and recording")
+def _created_at_not_null(conn):
+    # Keyset pagination seeks on (created_at, id); a NULL created_at can't be
+    # turned into a cursor and never matches the seek predicate. Rows without
+    # one are dated like the oldest row of their table, so they list last.
+    # (Run `flask rebuild-daily-stats` afterwards to count such recordings.)
+    for table in ("user", "recording"):
+        oldest = conn.execute(text(f"SELECT MIN(created_at) FROM {table}")).scalar()
+        conn.execute(text(f"UPDATE {table} SET created_at = :oldest WHERE created_at IS NULL"),
+                     {"oldest": oldest or datetime.utcnow()})
+        if conn.dialect.name == "mysql":
+            conn.execute(text(f"ALTER TABLE {table} MODIFY created_at DATETIME NOT NULL"))
+        # SQLite can't change a column's nullability in place; the model
+        # default keeps new rows filled in.
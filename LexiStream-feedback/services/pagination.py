@@ -0,0 +1,73 @@
+"""
+Keyset (seek) pagination for newest-first lists.
+
+Rows are ordered by (created_at, id), newest first, and a page is located
+by a cursor holding the (created_at, id) of the row it starts after,
+instead of an OFFSET. The database seeks straight into a
+(created_at, id) index, so the thousandth page costs the same as the
+first, and rows added meanwhile never shift or repeat entries between
+pages.
+
+Cursors are plain strings ("<created_at ISO>~<id>") meant to travel in the
+query string; an unreadable cursor just gives the first page.
+"""
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+
+@dataclass
+class Page:
+    items: list = field(default_factory=list)
+    older: str = None  # cursor for the next (older) page, if there is one
+    newer: str = None  # cursor for the previous (newer) page, if there is one
+
+
+def encode_cursor(created_at, row_id):
+    return f"{created_at.isoformat()}~{row_id}"
+
+
+def decode_cursor(value):
+    """(created_at, id) from a cursor string, or None if it is missing or malformed."""
+    if not value:
+        return None
+    try:
+        created_at, row_id = value.rsplit("~", 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except ValueError:
+        return None
+
+
+def keyset_page(query, created_col, id_col, after=None, before=None, per_page=50):
+    """
+    One page of `query`, newest first.
+
+    `after` is a cursor from a previous page's `older` (go further back),
+    `before` one from `newer` (come forward again); with neither, the newest
+    page is returned.
+    """
+    def cursor_of(item):
+        return encode_cursor(getattr(item, created_col.key), getattr(item, id_col.key))
+
+    after, before = decode_cursor(after), decode_cursor(before)
+    if before is not None:
+        created_at, row_id = before
+        rows = query.filter(or_(created_col > created_at,
+                                and_(created_col == created_at, id_col > row_id)))\
+            .order_by(created_col.asc(), id_col.asc()).limit(per_page + 1).all()
+        more_newer = len(rows) > per_page
+        items = rows[:per_page][::-1]
+        return Page(items=items,
+                    older=cursor_of(items[-1]) if items else None,
+                    newer=cursor_of(items[0]) if more_newer else None)
+
+    if after is not None:
+        created_at, row_id = after
+        query = query.filter(or_(created_col < created_at,
+                                 and_(created_col == created_at, id_col < row_id)))
+    rows = query.order_by(created_col.desc(), id_col.desc()).limit(per_page + 1).all()
+    items = rows[:per_page]
+    return Page(items=items,
+                older=cursor_of(items[-1]) if len(rows) > per_page else None,
+                newer=cursor_of(items[0]) if after is not None and items else None)
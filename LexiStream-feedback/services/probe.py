@@ -0,0 +1,536 @@
+"""
+Read audio metadata from container headers without decoding any audio.
+
+`probe_audio()` understands WAV, FLAC, MP3, WebM/Matroska, MP4/M4A and
+Ogg (Opus/Vorbis, what Firefox's MediaRecorder produces) and returns
+duration, sample rate, channel count and codec. It only parses headers
+(and, for WebM files from MediaRecorder, which carry no duration, the
+cluster/block timecodes; for Ogg, the last page's granule position), so it
+costs a few kilobytes of reads instead of a full ffmpeg decode. It works on
+a path or a seekable file object, which lets `record()` check an upload
+before it is written to disk.
+
+`ffprobe_audio()` asks ffprobe instead, with a time limit, for whatever
+else a browser or student may send.
+"""
+import json
+import os
+import shutil
+import struct
+import subprocess
+from dataclasses import dataclass
+
+
+class ProbeError(Exception):
+    """The file is not in a container format we recognize (or is corrupt)."""
+
+
+@dataclass
+class AudioInfo:
+    format: str
+    codec: str = None
+    duration: float = None
+    sample_rate: int = None
+    channels: int = None
+    bits_per_sample: int = None
+    size_bytes: int = None
+
+
+def probe_audio(source):
+    """Return AudioInfo for a path or seekable binary file object."""
+    if isinstance(source, (str, bytes, os.PathLike)):
+        with open(source, "rb") as f:
+            return _probe(f)
+    position = source.tell()
+    try:
+        return _probe(source)
+    finally:
+        source.seek(position)
+
+
+def _probe(f):
+    f.seek(0, os.SEEK_END)
+    size = f.tell()
+    f.seek(0)
+    head = f.read(12)
+    f.seek(0)
+
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        info = _probe_wav(f, size)
+    elif head[:4] == b"fLaC":
+        info = _probe_flac(f)
+    elif head[:4] == b"\x1a\x45\xdf\xa3":
+        info = _probe_matroska(f, size)
+    elif head[4:8] == b"ftyp":
+        info = _probe_mp4(f, size)
+    elif head[:4] == b"OggS":
+        info = _probe_ogg(f, size)
+    elif head[:3] == b"ID3" or (len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0):
+        info = _probe_mp3(f, size)
+    else:
+        raise ProbeError("Unrecognized audio container")
+    info.size_bytes = size
+    return info
+
+
+def _read_exact(f, n):
+    data = f.read(n)
+    if len(data) != n:
+        raise ProbeError("Unexpected end of file")
+    return data
+
+
+# --- WAV -------------------------------------------------------------------
+
+_WAV_CODECS = {1: "pcm", 3: "ieee_float", 6: "alaw", 7: "mulaw"}
+
+
+def _probe_wav(f, size):
+    f.seek(12)
+    fmt = None
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            break
+        chunk_id, chunk_size = struct.unpack("<4sI", header)
+        if chunk_id == b"fmt ":
+            fmt = _read_exact(f, chunk_size)
+            f.seek(chunk_size % 2, os.SEEK_CUR)
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise ProbeError("WAV data chunk before fmt chunk")
+            audio_format, channels, sample_rate, byte_rate, _, bits = struct.unpack("<HHIIHH", fmt[:16])
+            if audio_format == 0xFFFE and len(fmt) >= 26:
+                audio_format = struct.unpack("<H", fmt[24:26])[0]
+            # Streamed WAVs often leave the size as 0 or 0xFFFFFFFF.
+            available = size - f.tell()
+            if chunk_size == 0 or chunk_size > available:
+                chunk_size = available
+            return AudioInfo(
+                format="wav",
+                codec=_WAV_CODECS.get(audio_format, f"wav_0x{audio_format:04x}"),
+                duration=chunk_size / byte_rate if byte_rate else None,
+                sample_rate=sample_rate,
+                channels=channels,
+                bits_per_sample=bits,
+            )
+        else:
+            f.seek(chunk_size + chunk_size % 2, os.SEEK_CUR)
+    raise ProbeError("WAV file has no data chunk")
+
+
+# --- FLAC ------------------------------------------------------------------
+
+def _probe_flac(f):
+    f.seek(4)
+    block_header = _read_exact(f, 4)
+    if block_header[0] & 0x7F != 0:
+        raise ProbeError("FLAC file does not start with STREAMINFO")
+    streaminfo = _read_exact(f, 34)
+    packed = int.from_bytes(streaminfo[10:18], "big")
+    sample_rate = packed >> 44
+    channels = ((packed >> 41) & 0x7) + 1
+    bits = ((packed >> 36) & 0x1F) + 1
+    total_samples = packed & 0xFFFFFFFFF
+    return AudioInfo(
+        format="flac",
+        codec="flac",
+        duration=total_samples / sample_rate if sample_rate and total_samples else None,
+        sample_rate=sample_rate,
+        channels=channels,
+        bits_per_sample=bits,
+    )
+
+
+# --- MP3 -------------------------------------------------------------------
+
+_MP3_BITRATES = {
+    (1, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (1, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (2, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (2, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_MP3_SAMPLE_RATES = {1: [44100, 48000, 32000], 2: [22050, 24000, 16000], 2.5: [11025, 12000, 8000]}
+
+
+def _probe_mp3(f, size):
+    offset = 0
+    id3 = f.read(10)
+    if id3[:3] == b"ID3" and len(id3) == 10:
+        tag_size = (id3[6] << 21) | (id3[7] << 14) | (id3[8] << 7) | id3[9]
+        offset = 10 + tag_size + (10 if id3[5] & 0x10 else 0)
+
+    # Find the first frame sync after the tag.
+    f.seek(offset)
+    window = f.read(64 * 1024)
+    for i in range(len(window) - 4):
+        if window[i] == 0xFF and window[i + 1] & 0xE0 == 0xE0:
+            header = int.from_bytes(window[i:i + 4], "big")
+            version_bits = (header >> 19) & 0x3
+            layer_bits = (header >> 17) & 0x3
+            bitrate_index = (header >> 12) & 0xF
+            rate_index = (header >> 10) & 0x3
+            if version_bits == 1 or layer_bits == 0 or bitrate_index in (0, 15) or rate_index == 3:
+                continue
+            frame_offset = offset + i
+            break
+    else:
+        raise ProbeError("No MP3 frame found")
+
+    version = {0: 2.5, 2: 2, 3: 1}[version_bits]
+    layer = 4 - layer_bits
+    channels = 1 if (header >> 6) & 0x3 == 3 else 2
+    sample_rate = _MP3_SAMPLE_RATES[version][rate_index]
+    bitrate = _MP3_BITRATES[(1 if version == 1 else 2, layer)][bitrate_index] * 1000
+    samples_per_frame = 384 if layer == 1 else (1152 if version == 1 or layer == 2 else 576)
+
+    # A Xing/Info (or VBRI) header gives the exact frame count for VBR files.
+    frames = None
+    frame = window[i:i + 200]
+    side_info = (32 if channels == 2 else 17) if version == 1 else (17 if channels == 2 else 9)
+    xing = 4 + side_info
+    if frame[xing:xing + 4] in (b"Xing", b"Info") and len(frame) >= xing + 12:
+        flags = struct.unpack(">I", frame[xing + 4:xing + 8])[0]
+        if flags & 0x1:
+            frames = struct.unpack(">I", frame[xing + 8:xing + 12])[0]
+    elif frame[36:40] == b"VBRI" and len(frame) >= 54:
+        frames = struct.unpack(">I", frame[50:54])[0]
+
+    if frames:
+        duration = frames * samples_per_frame / sample_rate
+    else:
+        duration = (size - frame_offset) * 8 / bitrate if bitrate else None
+    return AudioInfo(
+        format="mp3",
+        codec="mp3",
+        duration=duration,
+        sample_rate=sample_rate,
+        channels=channels,
+    )
+
+
+# --- WebM / Matroska -------------------------------------------------------
+
+_EBML_SEGMENT = 0x18538067
+_EBML_INFO = 0x1549A966
+_EBML_TIMECODE_SCALE = 0x2AD7B1
+_EBML_DURATION = 0x4489
+_EBML_TRACKS = 0x1654AE6B
+_EBML_TRACK_ENTRY = 0xAE
+_EBML_TRACK_TYPE = 0x83
+_EBML_CODEC_ID = 0x86
+_EBML_AUDIO = 0xE1
+_EBML_SAMPLING_FREQUENCY = 0xB5
+_EBML_CHANNELS = 0x9F
+_EBML_BIT_DEPTH = 0x6264
+_EBML_CLUSTER = 0x1F43B675
+_EBML_CLUSTER_TIMECODE = 0xE7
+_EBML_SIMPLE_BLOCK = 0xA3
+_EBML_BLOCK_GROUP = 0xA0
+_EBML_BLOCK = 0xA1
+_EBML_BLOCK_DURATION = 0x9B
+# Level-1 elements; seeing one ends a cluster of unknown size.
+_EBML_TOP_LEVEL = {0x114D9B74, _EBML_INFO, _EBML_TRACKS, _EBML_CLUSTER,
+                   0x1C53BB6B, 0x1941A469, 0x1043A770, 0x1254C367}
+_MATROSKA_CODECS = {"A_OPUS": "opus", "A_VORBIS": "vorbis", "A_FLAC": "flac",
+                    "A_AAC": "aac", "A_MPEG/L3": "mp3", "A_PCM/INT/LIT": "pcm"}
+
+
+def _read_vint(f, keep_marker):
+    first = f.read(1)
+    if not first:
+        return None, 0
+    b = first[0]
+    length = 1
+    mask = 0x80
+    while length <= 8 and not b & mask:
+        mask >>= 1
+        length += 1
+    if length > 8:
+        raise ProbeError("Invalid EBML variable-length integer")
+    rest = f.read(length - 1)
+    if len(rest) != length - 1:
+        return None, 0
+    value = b if keep_marker else b & (mask - 1)
+    all_ones = (b & (mask - 1)) == mask - 1 and all(x == 0xFF for x in rest)
+    for x in rest:
+        value = (value << 8) | x
+    if not keep_marker and all_ones:
+        return -1, length  # unknown size
+    return value, length
+
+
+def _read_element_header(f):
+    element_id, _ = _read_vint(f, keep_marker=True)
+    if element_id is None:
+        return None, None
+    element_size, _ = _read_vint(f, keep_marker=False)
+    if element_size is None:
+        return None, None
+    return element_id, element_size
+
+
+def _read_uint(data):
+    return int.from_bytes(data, "big") if data else 0
+
+
+def _read_float(data):
+    if len(data) == 4:
+        return struct.unpack(">f", data)[0]
+    if len(data) == 8:
+        return struct.unpack(">d", data)[0]
+    return None
+
+
+def _probe_matroska(f, size):
+    info = AudioInfo(format="webm")
+    timecode_scale = 1000000  # ns per timecode unit (Matroska default)
+    declared_duration = None
+    last_block_time = None
+    block_duration = 0
+
+    element_id, element_size = _read_element_header(f)  # EBML header
+    f.seek(element_size, os.SEEK_CUR)
+    element_id, element_size = _read_element_header(f)
+    if element_id != _EBML_SEGMENT:
+        raise ProbeError("Matroska file has no Segment")
+    segment_end = size if element_size < 0 else min(size, f.tell() + element_size)
+
+    while f.tell() < segment_end:
+        element_id, element_size = _read_element_header(f)
+        if element_id is None:
+            break
+        payload_start = f.tell()
+        payload_end = segment_end if element_size < 0 else payload_start + element_size
+
+        if element_id == _EBML_INFO:
+            for child_id, child_size in _children(f, payload_end):
+                data = f.read(child_size)
+                if child_id == _EBML_TIMECODE_SCALE:
+                    timecode_scale = _read_uint(data)
+                elif child_id == _EBML_DURATION:
+                    declared_duration = _read_float(data)
+        elif element_id == _EBML_TRACKS:
+            for child_id, child_size in _children(f, payload_end):
+                entry_end = f.tell() + child_size
+                if child_id == _EBML_TRACK_ENTRY and info.codec is None:
+                    _read_track_entry(f, entry_end, info)
+                f.seek(entry_end)
+        elif element_id == _EBML_CLUSTER:
+            cluster_time = 0
+            for child_id, child_size in _children(f, payload_end, stop_ids=_EBML_TOP_LEVEL):
+                child_end = f.tell() + child_size
+                if child_id == _EBML_CLUSTER_TIMECODE:
+                    cluster_time = _read_uint(f.read(child_size))
+                elif child_id == _EBML_SIMPLE_BLOCK:
+                    last_block_time = cluster_time + _block_timecode(f)
+                elif child_id == _EBML_BLOCK_GROUP:
+                    for sub_id, sub_size in _children(f, child_end):
+                        sub_end = f.tell() + sub_size
+                        if sub_id == _EBML_BLOCK:
+                            last_block_time = cluster_time + _block_timecode(f)
+                            block_duration = 0
+                        elif sub_id == _EBML_BLOCK_DURATION:
+                            block_duration = _read_uint(f.read(sub_size))
+                        f.seek(sub_end)
+                f.seek(child_end)
+            if element_size < 0:
+                continue  # _children stopped at the next top-level element
+        f.seek(payload_end)
+
+    if declared_duration:
+        info.duration = declared_duration * timecode_scale / 1e9
+    elif last_block_time is not None:
+        info.duration = (last_block_time + block_duration) * timecode_scale / 1e9
+    if info.codec is None:
+        raise ProbeError("Matroska file has no audio track")
+    return info
+
+
+def _children(f, end, stop_ids=()):
+    """Yield (id, size) of child elements, leaving f at each payload start."""
+    while f.tell() < end:
+        start = f.tell()
+        element_id, element_size = _read_element_header(f)
+        if element_id is None:
+            return
+        if element_id in stop_ids or element_size < 0:
+            f.seek(start)
+            return
+        if f.tell() + element_size > end:
+            element_size = max(0, end - f.tell())
+        yield element_id, element_size
+
+
+def _read_track_entry(f, end, info):
+    track_type = None
+    codec = None
+    audio = {}
+    for child_id, child_size in _children(f, end):
+        child_end = f.tell() + child_size
+        if child_id == _EBML_TRACK_TYPE:
+            track_type = _read_uint(f.read(child_size))
+        elif child_id == _EBML_CODEC_ID:
+            codec = f.read(child_size).rstrip(b"\x00").decode("ascii", "replace")
+        elif child_id == _EBML_AUDIO:
+            for sub_id, sub_size in _children(f, child_end):
+                data = f.read(sub_size)
+                if sub_id == _EBML_SAMPLING_FREQUENCY:
+                    audio["sample_rate"] = _read_float(data)
+                elif sub_id == _EBML_CHANNELS:
+                    audio["channels"] = _read_uint(data)
+                elif sub_id == _EBML_BIT_DEPTH:
+                    audio["bits"] = _read_uint(data)
+        f.seek(child_end)
+    if track_type == 2 or (track_type is None and audio):
+        info.codec = _MATROSKA_CODECS.get(codec, (codec or "unknown").lower())
+        if audio.get("sample_rate"):
+            info.sample_rate = int(audio["sample_rate"])
+        info.channels = audio.get("channels", 1)
+        info.bits_per_sample = audio.get("bits")
+
+
+def _block_timecode(f):
+    """Relative timecode of a (Simple)Block whose payload starts at f."""
+    _read_vint(f, keep_marker=False)  # track number
+    data = f.read(2)
+    return struct.unpack(">h", data)[0] if len(data) == 2 else 0
+
+
+# --- MP4 / M4A -------------------------------------------------------------
+
+_MP4_CONTAINERS = {b"moov", b"trak", b"mdia", b"minf", b"stbl"}
+_MP4_CODECS = {b"mp4a": "aac", b"alac": "alac", b"Opus": "opus", b"fLaC": "flac"}
+
+
+def _probe_mp4(f, size):
+    info = AudioInfo(format="mp4")
+    _walk_mp4(f, 0, size, info)
+    if info.duration is None and info.codec is None:
+        raise ProbeError("MP4 file has no movie header")
+    return info
+
+
+def _walk_mp4(f, start, end, info):
+    position = start
+    while position + 8 <= end:
+        f.seek(position)
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        box_size, box_type = struct.unpack(">I4s", header)
+        header_size = 8
+        if box_size == 1:
+            box_size = struct.unpack(">Q", _read_exact(f, 8))[0]
+            header_size = 16
+        elif box_size == 0:
+            box_size = end - position
+        if box_size < header_size:
+            return
+        payload = position + header_size
+        if box_type in _MP4_CONTAINERS:
+            _walk_mp4(f, payload, position + box_size, info)
+        elif box_type == b"mvhd":
+            version = _read_exact(f, 4)[0]
+            if version == 1:
+                f.seek(16, os.SEEK_CUR)
+                timescale, duration = struct.unpack(">IQ", _read_exact(f, 12))
+            else:
+                f.seek(8, os.SEEK_CUR)
+                timescale, duration = struct.unpack(">II", _read_exact(f, 8))
+            if timescale:
+                info.duration = duration / timescale
+        elif box_type == b"stsd" and info.codec is None:
+            f.seek(8, os.SEEK_CUR)  # version/flags + entry count
+            entry = f.read(36)
+            if len(entry) == 36 and entry[4:8] in _MP4_CODECS:
+                info.codec = _MP4_CODECS[entry[4:8]]
+                info.channels, info.bits_per_sample = struct.unpack(">HH", entry[24:28])
+                info.sample_rate = struct.unpack(">I", entry[32:36])[0] >> 16
+        position += box_size
+
+
+# --- Ogg (Opus / Vorbis) ---------------------------------------------------
+
+_OGG_PAGE_HEADER = struct.Struct("<4sBBqIIIB")  # capture, version, flags, granule, serial, seq, crc, segments
+_OGG_TAIL_BYTES = 64 * 1024
+
+
+def _probe_ogg(f, size):
+    header = _read_exact(f, _OGG_PAGE_HEADER.size)
+    segments = header[-1]
+    lacing = _read_exact(f, segments)
+    packet = f.read(min(sum(lacing), 64))  # the identification header is the first packet
+
+    if packet[:8] == b"OpusHead" and len(packet) >= 19:
+        # Opus always runs at 48 kHz; the rate in the header is only the input's.
+        channels = packet[9]
+        pre_skip, input_rate = struct.unpack("<HI", packet[10:16])
+        info = AudioInfo(format="ogg", codec="opus", sample_rate=input_rate or 48000, channels=channels)
+        granule_rate, skip = 48000, pre_skip
+    elif packet[:7] == b"\x01vorbis" and len(packet) >= 16:
+        channels = packet[11]
+        sample_rate = struct.unpack("<I", packet[12:16])[0]
+        info = AudioInfo(format="ogg", codec="vorbis", sample_rate=sample_rate, channels=channels)
+        granule_rate, skip = sample_rate, 0
+    else:
+        raise ProbeError("Ogg file is neither Opus nor Vorbis")
+
+    granule = _last_ogg_granule(f, size)
+    if granule is not None and granule_rate:
+        info.duration = max(0, granule - skip) / granule_rate
+    return info
+
+
+def _last_ogg_granule(f, size):
+    """Granule position of the last complete page header near the end of the file."""
+    start = max(0, size - _OGG_TAIL_BYTES)
+    f.seek(start)
+    tail = f.read()
+    position = len(tail)
+    while True:
+        position = tail.rfind(b"OggS", 0, position)
+        if position < 0:
+            return None
+        page = tail[position:position + _OGG_PAGE_HEADER.size]
+        if len(page) == _OGG_PAGE_HEADER.size:
+            granule = _OGG_PAGE_HEADER.unpack(page)[3]
+            if granule >= 0:  # -1: no packet ends on this page
+                return granule
+
+
+# --- Anything else, via ffprobe ---------------------------------------------
+
+def ffprobe_audio(path, timeout=10):
+    """
+    AudioInfo from ffprobe, for containers `probe_audio()` doesn't parse.
+
+    Raises ProbeError if ffprobe isn't installed, takes longer than
+    `timeout` seconds, or finds no audio stream.
+    """
+    executable = shutil.which("ffprobe")
+    if executable is None:
+        raise ProbeError("ffprobe is not installed")
+    try:
+        result = subprocess.run(
+            [executable, "-v", "error", "-print_format", "json", "-show_format", "-show_streams", path],
+            capture_output=True, timeout=timeout, check=True,
+        )
+        data = json.loads(result.stdout)
+    except (subprocess.SubprocessError, ValueError) as e:
+        raise ProbeError(f"ffprobe could not read the file: {e}")
+    stream = next((s for s in data.get("streams", []) if s.get("codec_type") == "audio"), None)
+    if stream is None:
+        raise ProbeError("No audio stream found")
+    container = data.get("format", {})
+    duration = container.get("duration") or stream.get("duration")
+    return AudioInfo(
+        format=(container.get("format_name") or "unknown").split(",")[0],
+        codec=stream.get("codec_name"),
+        duration=float(duration) if duration else None,
+        sample_rate=int(stream["sample_rate"]) if stream.get("sample_rate") else None,
+        channels=stream.get("channels"),
+        size_bytes=int(container["size"]) if container.get("size") else None,
+    )
@@ -0,0 +1,129 @@
+"""
+Token-bucket rate limits for outside services (speech recognition, Cohere).
+
+Each provider has one bucket holding up to `burst` tokens, refilled at
+`rate` tokens per second; a call takes one token (a transcription takes
+one per segment). The bucket lives in a small SQLite file, the same one as
+`services.cache`, so every worker process on the host draws from it and a
+class pressing stop at once is spread out instead of all hitting the
+provider's own throttling together.
+
+When the bucket is empty a call reserves the next free token and sleeps
+until it is due: the bucket goes negative and the deficit is the wait
+queue, shared across processes. The queue is bounded by `max_queue`; a
+call that would go past it raises `RateLimited` straight away, and the
+caller sheds it according to the provider's `shed` setting ("defer" the
+work for later, or use the "fallback").
+
+Recorded in `services.metrics` for each provider:
+    ratelimit.<provider>.acquired      calls let through
+    ratelimit.<provider>.delayed       calls that had to queue first
+    ratelimit.<provider>.shed          calls refused because the queue was full
+    ratelimit.<provider>.wait_seconds  histogram of time spent queued
+    ratelimit.<provider>.queue_depth   tokens owed after the last call
+"""
+import math
+import time
+
+from services import metrics
+from services.sqlite_store import LocalSQLite
+
+SHED_DEFER = "defer"
+SHED_FALLBACK = "fallback"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rate_buckets (
+    provider    TEXT PRIMARY KEY,
+    tokens      REAL NOT NULL,
+    updated_at  REAL NOT NULL
+);
+"""
+
+
+class RateLimited(Exception):
+    """Raised when a call is shed because the provider's wait queue is full."""
+
+    def __init__(self, provider, retry_after, shed=SHED_DEFER):
+        super().__init__(f"{provider} is busy: too many requests are already waiting")
+        self.provider = provider
+        self.retry_after = retry_after
+        self.shed = shed
+
+
+class RateLimiter:
+    def __init__(self, path, provider, rate, burst=1, max_queue=0, shed=SHED_DEFER):
+        if shed not in (SHED_DEFER, SHED_FALLBACK):
+            raise ValueError(f"Unknown shed behavior {shed!r} for {provider}")
+        self.path = path
+        self.provider = provider
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self.max_queue = max_queue
+        self.shed = shed
+        self._db = LocalSQLite(path, _SCHEMA)
+
+    def _conn(self):
+        return self._db.connection()
+
+    def _tokens(self, conn, now):
+        """Current token count, refilled for the time since the last update."""
+        row = conn.execute(
+            "SELECT tokens, updated_at FROM rate_buckets WHERE provider = ?", (self.provider,)
+        ).fetchone()
+        if row is None:
+            return float(self.burst)
+        tokens, updated_at = row
+        return min(float(self.burst), tokens + max(0.0, now - updated_at) * self.rate)
+
+    def _reserve(self, cost, max_queue):
+        """Take `cost` tokens, going into debt if needed: (wait, None), or (None, retry_after) if shed."""
+        conn = self._conn()
+        # IMMEDIATE takes the write lock up front, so processes can't interleave the read-modify-write.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            tokens = self._tokens(conn, now)
+            owed = max(0.0, cost - tokens)
+            # A call bigger than the whole queue (a long recording) still goes in when
+            # nobody else is waiting, or it could never run at all.
+            if max_queue is not None and owed > max_queue and (tokens < 0 or not max_queue):
+                conn.execute("COMMIT")
+                metrics.set_gauge(f"ratelimit.{self.provider}.queue_depth", math.ceil(max(0.0, -tokens)))
+                return None, (owed - max_queue) / self.rate
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_buckets (provider, tokens, updated_at) VALUES (?, ?, ?)",
+                (self.provider, tokens - cost, now),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        metrics.set_gauge(f"ratelimit.{self.provider}.queue_depth", math.ceil(owed))
+        return owed / self.rate, None
+
+    def acquire(self, cost=1, block=True, bounded=True):
+        """
+        Wait until `cost` calls may be made, or raise RateLimited.
+
+        `block=False` only goes ahead if tokens are free right now (for
+        opportunistic work); `bounded=False` queues however long the queue
+        is (for backfills that would rather wait than fail).
+        """
+        if block:
+            max_queue = self.max_queue if bounded else None
+        else:
+            max_queue = 0
+        wait, retry_after = self._reserve(cost, max_queue)
+        if wait is None:
+            metrics.incr(f"ratelimit.{self.provider}.shed")
+            raise RateLimited(self.provider, retry_after, self.shed)
+        metrics.incr(f"ratelimit.{self.provider}.acquired")
+        if wait > 0:
+            metrics.incr(f"ratelimit.{self.provider}.delayed")
+            metrics.observe(f"ratelimit.{self.provider}.wait_seconds", wait)
+            time.sleep(wait)
+
+    def queue_depth(self):
+        """Calls currently waiting for this provider, across all processes."""
+        conn = self._conn()
+        return math.ceil(max(0.0, -self._tokens(conn, time.time())))
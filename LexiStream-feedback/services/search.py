@@ -0,0 +1,130 @@
+"""
+Full-text search over recording transcripts and AI feedback.
+
+SQLite uses an FTS5 table (`recording_fts`) that indexes the recording
+table's own columns ("external content"). Triggers on `recording` add,
+replace and remove its entries, so inserts, updates and deletes keep it
+current, including bulk `Query.delete()`s. MySQL uses a FULLTEXT index on
+(transcript, ai_feedback), which InnoDB maintains by itself.
+
+A query is a list of words that must all appear, ranked by relevance
+(BM25 on SQLite, MySQL's own score), or a "quoted phrase" whose words must
+appear in that order. Transcript matches weigh more than feedback matches
+on SQLite. On MySQL, words shorter than `innodb_ft_min_token_size` (3 by
+default) and stopwords are ignored.
+"""
+import re
+from dataclasses import dataclass
+
+from sqlalchemy import text
+
+_SQLITE_INSTALL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS recording_fts USING fts5("
+    "  transcript, ai_feedback, content='recording', content_rowid='id',"
+    "  tokenize='porter unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS recording_fts_insert AFTER INSERT ON recording BEGIN"
+    "  INSERT INTO recording_fts (rowid, transcript, ai_feedback)"
+    "  VALUES (new.id, new.transcript, new.ai_feedback);"
+    " END",
+    "CREATE TRIGGER IF NOT EXISTS recording_fts_delete AFTER DELETE ON recording BEGIN"
+    "  INSERT INTO recording_fts (recording_fts, rowid, transcript, ai_feedback)"
+    "  VALUES ('delete', old.id, old.transcript, old.ai_feedback);"
+    " END",
+    "CREATE TRIGGER IF NOT EXISTS recording_fts_update AFTER UPDATE OF transcript, ai_feedback ON recording BEGIN"
+    "  INSERT INTO recording_fts (recording_fts, rowid, transcript, ai_feedback)"
+    "  VALUES ('delete', old.id, old.transcript, old.ai_feedback);"
+    "  INSERT INTO recording_fts (rowid, transcript, ai_feedback)"
+    "  VALUES (new.id, new.transcript, new.ai_feedback);"
+    " END",
+]
+
+_MYSQL_INSTALL = [
+    "CREATE FULLTEXT INDEX ft_recording_text ON recording (transcript, ai_feedback)",
+]
+
+# Relative weight of the transcript and ai_feedback columns in SQLite's ranking.
+_SQLITE_RANK = "bm25(recording_fts, 2.0, 1.0)"
+
+
+def install(conn):
+    """Create the search index for the connection's database (on a recording table with no index yet)."""
+    for statement in (_MYSQL_INSTALL if conn.dialect.name == "mysql" else _SQLITE_INSTALL):
+        conn.execute(text(statement))
+
+
+def rebuild(conn):
+    """Re-index every recording (SQLite; MySQL's FULLTEXT index never needs it)."""
+    if conn.dialect.name != "mysql":
+        conn.execute(text("INSERT INTO recording_fts (recording_fts) VALUES ('rebuild')"))
+
+
+@dataclass
+class SearchQuery:
+    terms: list
+    phrase: bool
+
+    def __bool__(self):
+        return bool(self.terms)
+
+
+def parse_query(value):
+    """Words of a search box entry; surrounding double quotes make it a phrase."""
+    value = (value or "").strip()
+    phrase = len(value) > 1 and value.startswith('"') and value.endswith('"')
+    return SearchQuery(terms=re.findall(r"\w+", value.lower()), phrase=phrase)
+
+
+def _match_expression(query, dialect):
+    # Every word is quoted, so nothing typed is read as an operator (AND, NEAR, -, * ...).
+    if query.phrase:
+        return '"' + " ".join(query.terms) + '"'
+    if dialect == "mysql":
+        return " ".join("+" + term for term in query.terms)
+    return " ".join(f'"{term}"' for term in query.terms)
+
+
+def search_recording_ids(session, query, limit, offset=0):
+    """Ids of recordings matching `query`, best first."""
+    dialect = session.get_bind().dialect.name
+    params = {"q": _match_expression(query, dialect), "limit": limit, "offset": offset}
+    if dialect == "mysql":
+        sql = ("SELECT id FROM recording "
+               "WHERE MATCH (transcript, ai_feedback) AGAINST (:q IN BOOLEAN MODE) "
+               "ORDER BY MATCH (transcript, ai_feedback) AGAINST (:q IN BOOLEAN MODE) DESC, id DESC "
+               "LIMIT :limit OFFSET :offset")
+    else:
+        sql = ("SELECT rowid FROM recording_fts WHERE recording_fts MATCH :q "
+               f"ORDER BY {_SQLITE_RANK}, rowid DESC LIMIT :limit OFFSET :offset")
+    return [row[0] for row in session.execute(text(sql), params)]
+
+
+def _snippet(value, query, width):
+    if not value:
+        return None
+    if query.phrase:
+        pattern = r"\b" + r"\W+".join(map(re.escape, query.terms))
+    else:
+        pattern = r"\b(?:" + "|".join(map(re.escape, query.terms)) + ")"
+    found = re.search(pattern, value, re.IGNORECASE)
+    if found is None:
+        return None
+    start, end = found.span()
+    return (("..." if start > width else "") + value[max(0, start - width):start],
+            found.group(0),
+            value[end:end + width] + ("..." if end + width < len(value) else ""))
+
+
+def snippet(transcript, feedback, query, width=80):
+    """
+    Where a result matched: ("transcript" or "feedback", (before, match, after)).
+
+    Plain strings, so the template escapes them and marks the match itself.
+    A match only found through stemming ("reading" for "read") shows the
+    start of the transcript with nothing marked.
+    """
+    for source, value in (("transcript", transcript), ("feedback", feedback)):
+        parts = _snippet(value, query, width)
+        if parts:
+            return source, parts
+    value = transcript or ""
+    return "transcript", (value[:width * 2] + ("..." if len(value) > width * 2 else ""), "", "")
@@ -0,0 +1,32 @@
+"""
+Connections to a small SQLite file on the local host.
+
+`services.cache` and `services.ratelimit` keep their state in such a file
+(WAL mode), shared by every worker process without touching the main
+database. sqlite3 connections must not cross threads or forked processes,
+so each thread of each process opens its own.
+"""
+import os
+import sqlite3
+import threading
+
+
+class LocalSQLite:
+    def __init__(self, path, schema):
+        self.path = path
+        self.schema = schema
+        self._local = threading.local()
+
+    def connection(self):
+        """This thread's autocommit connection, opened (creating `schema`) on first use in the process."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(self.schema)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
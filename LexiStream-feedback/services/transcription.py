@@ -0,0 +1,106 @@
+"""
+Segment-parallel transcription.
+
+Long recordings are split at pauses (see `services.audio`) and each segment
+is sent to the recognizer on its own thread. Results are joined back in
+order; a segment that fails only loses its own text.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from services import metrics
+
+
+@dataclass
+class SegmentResult:
+    index: int
+    start_ms: int
+    end_ms: int
+    text: str = ""
+    error: str = None
+    elapsed: float = 0.0
+
+    def as_dict(self):
+        return {
+            "start": round(self.start_ms / 1000, 2),
+            "end": round(self.end_ms / 1000, 2),
+            "text": self.text,
+            "error": self.error,
+            "elapsed": round(self.elapsed, 3),
+        }
+
+
+@dataclass
+class TranscriptionResult:
+    segments: list = field(default_factory=list)
+    cached: bool = False
+    speech_ms: int = None  # voiced audio only, leading/trailing silence and pauses excluded
+
+    @classmethod
+    def from_dicts(cls, items, cached=False, speech_ms=None):
+        """Rebuild a result from `segments_as_dicts()` output (e.g. from a cache)."""
+        segments = [
+            SegmentResult(
+                index=i,
+                start_ms=int(round(item["start"] * 1000)),
+                end_ms=int(round(item["end"] * 1000)),
+                text=item.get("text") or "",
+                error=item.get("error"),
+                elapsed=item.get("elapsed", 0.0),
+            )
+            for i, item in enumerate(items)
+        ]
+        return cls(segments=segments, cached=cached, speech_ms=speech_ms)
+
+    @property
+    def complete(self):
+        """True when every segment was transcribed without an error."""
+        return all(s.error is None for s in self.segments)
+
+    @property
+    def text(self):
+        return " ".join(s.text for s in self.segments if s.text).strip()
+
+    @property
+    def error(self):
+        """An error message only when nothing at all could be transcribed."""
+        if self.text:
+            return None
+        for segment in self.segments:
+            if segment.error:
+                return segment.error
+        return "Could not understand audio. Please speak more clearly."
+
+    def segments_as_dicts(self):
+        return [s.as_dict() for s in self.segments]
+
+
+def _transcribe_one(recognize, audio, index, start_ms, end_ms):
+    result = SegmentResult(index=index, start_ms=start_ms, end_ms=end_ms)
+    started = time.perf_counter()
+    try:
+        result.text = (recognize(audio[start_ms:end_ms]) or "").strip()
+    except Exception as e:
+        result.error = str(e)
+        metrics.incr("transcription.segment_errors")
+    result.elapsed = time.perf_counter() - started
+    metrics.observe("transcription.segment_seconds", result.elapsed)
+    return result
+
+
+def transcribe_segments(audio, spans, recognize, max_workers=4):
+    """
+    Run recognize(AudioSegment) -> str over each (start_ms, end_ms) span.
+
+    `recognize` should return "" for unintelligible audio and raise for real
+    failures (network, quota); either way the other segments still complete.
+    """
+    jobs = [(i, start, end) for i, (start, end) in enumerate(spans)]
+    if len(jobs) <= 1 or max_workers <= 1:
+        segments = [_transcribe_one(recognize, audio, *job) for job in jobs]
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(jobs))) as pool:
+            segments = list(pool.map(lambda job: _transcribe_one(recognize, audio, *job), jobs))
+    metrics.incr("transcription.segments", len(segments))
+    return TranscriptionResult(segments=segments)
@@ -5,6 +5,12 @@ let startTime;
 let timerInterval;
 let duration = 0;
 
+// Chunked streaming upload: chunks are sent while recording so the server can
+// start transcribing before the student presses stop. If anything goes wrong
+// we fall back to uploading the whole file with the form below.
+const STREAM_TIMESLICE_MS = 2000;
+let streamUpload = null;
+
 const startRecordBtn = document.getElementById('startRecord');
 const stopRecordBtn = document.getElementById('stopRecord');
 const recordingStatus = document.getElementById('recordingStatus');
@@ -27,19 +33,25 @@ async function startRecording() {
         const stream = await navigator.mediaDevices.getUserMedia({ audio: true });
         mediaRecorder = new MediaRecorder(stream);
         audioChunks = [];
+        streamUpload = await startStreamUpload();
 
         mediaRecorder.ondataavailable = (event) => {
             audioChunks.push(event.data);
+            if (streamUpload && event.data.size > 0) {
+                queueChunk(streamUpload, event.data);
+            }
         };
 
         mediaRecorder.onstop = () => {
-            const audioBlob = new Blob(audioChunks, { type: 'audio/webm' });
+            // Chrome records WebM, Firefox Ogg and Safari MP4; keep the recorder's own type
+            const mimeType = mediaRecorder.mimeType || 'audio/webm';
+            const audioBlob = new Blob(audioChunks, { type: mimeType });
             const audioUrl = URL.createObjectURL(audioBlob);
             audioPlayback.src = audioUrl;
             audioPlayback.style.display = 'block';
 
             // Create file input
-            const file = new File([audioBlob], `recording_${Date.now()}.webm`, { type: 'audio/webm' });
+            const file = new File([audioBlob], `recording_${Date.now()}.${fileExtensionFor(mimeType)}`, { type: mimeType });
             const dataTransfer = new DataTransfer();
             dataTransfer.items.add(file);
             audioFileInput.files = dataTransfer.files;
@@ -49,9 +61,19 @@ async function startRecording() {
 
             // Stop all tracks
             stream.getTracks().forEach(track => track.stop());
+
+            if (streamUpload) {
+                recordingStatus.textContent = 'Saving recording...';
+                finishStreamUpload(streamUpload).then((saved) => {
+                    if (!saved) {
+                        recordingStatus.textContent = '✓ Recording complete';
+                        recordForm.style.display = 'block';
+                    }
+                });
+            }
         };
 
-        mediaRecorder.start();
+        mediaRecorder.start(STREAM_TIMESLICE_MS);
         startTime = Date.now();
         startRecordBtn.disabled = true;
         stopRecordBtn.disabled = false;
@@ -66,6 +88,12 @@ async function startRecording() {
     }
 }
 
+function fileExtensionFor(mimeType) {
+    // "audio/ogg;codecs=opus" -> "ogg"; the server only accepts the extensions it knows
+    const subtype = mimeType.split(';')[0].split('/')[1];
+    return { ogg: 'ogg', mp4: 'm4a', 'x-m4a': 'm4a', mpeg: 'mp3', wav: 'wav' }[subtype] || 'webm';
+}
+
 function stopRecording() {
     if (mediaRecorder && mediaRecorder.state !== 'inactive') {
         mediaRecorder.stop();
@@ -74,7 +102,93 @@ function stopRecording() {
         stopRecordBtn.disabled = true;
         recordingStatus.textContent = '✓ Recording complete';
         recordingStatus.classList.remove('recording');
-        recordForm.style.display = 'block';
+        if (!streamUpload) {
+            recordForm.style.display = 'block';
+        }
+    }
+}
+
+async function startStreamUpload() {
+    const startUrl = recordForm && recordForm.dataset.streamStartUrl;
+    if (!startUrl) {
+        return null;
+    }
+    try {
+        const response = await fetch(startUrl, { method: 'POST' });
+        if (!response.ok) {
+            return null;
+        }
+        const data = await response.json();
+        return {
+            chunkUrl: data.chunk_url,
+            finishUrl: data.finish_url,
+            abortUrl: data.abort_url,
+            offset: 0,
+            failed: false,
+            pending: Promise.resolve()
+        };
+    } catch (error) {
+        console.error('Error starting streaming upload:', error);
+        return null;
+    }
+}
+
+function queueChunk(upload, chunk) {
+    // Chunks are sent one at a time, in order; the offset lets the server
+    // ignore a chunk it already has if a request is retried.
+    upload.pending = upload.pending.then(async () => {
+        if (upload.failed) {
+            return;
+        }
+        try {
+            const response = await fetch(`${upload.chunkUrl}?offset=${upload.offset}`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/octet-stream' },
+                body: chunk
+            });
+            if (!response.ok) {
+                throw new Error(`Server responded with ${response.status}`);
+            }
+            upload.offset += chunk.size;
+        } catch (error) {
+            console.error('Error uploading recording chunk:', error);
+            upload.failed = true;
+        }
+    });
+}
+
+async function abortStreamUpload(upload) {
+    // The form upload takes over; drop the half-sent copy on the server.
+    try {
+        await fetch(upload.abortUrl, { method: 'POST' });
+    } catch (error) {
+        console.error('Error aborting streaming upload:', error);
+    }
+}
+
+async function finishStreamUpload(upload) {
+    await upload.pending;
+    if (upload.failed) {
+        await abortStreamUpload(upload);
+        return false;
+    }
+    try {
+        const body = new FormData();
+        body.append('duration', duration);
+        const response = await fetch(upload.finishUrl, { method: 'POST', body });
+        if (!response.ok) {
+            if (response.status !== 400) {
+                await abortStreamUpload(upload);  // a 400 has already removed it
+            }
+            return false;
+        }
+        const data = await response.json();
+        window.location.href = data.redirect_url;
+        return true;
+    } catch (error) {
+        console.error('Error finishing streaming upload:', error);
+        await abortStreamUpload(upload);
+        return false;
     }
 }
 